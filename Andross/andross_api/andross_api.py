@@ -1,9 +1,144 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
 from os import getenv
 
-from ratelimiter import RateLimiter
-import requests
+import aiohttp
+
+from Andross.andross_api.limits import andross_limiter
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
 
 api_key = getenv('API_KEY')
 api_url = 'http://' + getenv('API_URL')
 authorization_header = {"X-API-KEY": api_key, 'Content-Type': 'application/json'}
 
+api_timeout = float(getenv('API_TIMEOUT', 15))
+api_pool_size = int(getenv('API_POOL_SIZE', 50))
+graph_max_bytes = int(getenv('GRAPH_MAX_BYTES', 8 * 1024 * 1024))
+
+
+def user_key(user: int | str) -> str:
+    """Returns the path component used by /rest/user/ for a discord id or connect code."""
+    return str(user).lower().replace('#', '-')
+
+
+class ResponseTooLargeError(Exception):
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(f'{path} is larger than {max_bytes} bytes')
+        self.path = path
+        self.max_bytes = max_bytes
+
+
+@dataclass(frozen=True)
+class ApiResponse:
+    status_code: int
+    content: bytes
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+
+class AndrossAPI:
+    """Async client for the Andross REST API, every call goes through one pooled keep-alive session."""
+
+    def __init__(self, base_url: str = api_url, timeout: float = api_timeout, pool_size: int = api_pool_size):
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        # aiohttp refuses None header values, requests used to silently drop them
+        self.auth_headers = {key: value for key, value in authorization_header.items() if value is not None}
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str, endpoint: str | None = None, **kwargs) -> ApiResponse:
+        """endpoint is the templated path used as the metrics label, so ids don't explode the label set."""
+        logger.debug('%s %s %s', method, path, kwargs.get('params'))
+        async with andross_limiter.slot(), \
+                metrics.track_upstream('andross', f'{method} {endpoint or path}') as tracker:
+            async with self.session.request(method, f'{self.base_url}{path}', **kwargs) as response:
+                tracker['status'] = response.status
+                return ApiResponse(response.status, await response.read())
+
+    async def get_user(self, user: int | str) -> ApiResponse:
+        return await self._request('GET', f'/rest/user/{user_key(user)}', '/rest/user/{id}')
+
+    async def post_user(self, discord_id: int, connect_code: str, name: str) -> ApiResponse:
+        return await self._request('POST', f'/rest/user/{discord_id}', '/rest/user/{id}',
+                                   params={'cc': connect_code, 'name': name},
+                                   headers=self.auth_headers)
+
+    async def resolve_user(self, discord_id: int, connect_code: str) -> tuple[ApiResponse, ApiResponse]:
+        """Looks a user up by discord id and by connect code concurrently, (by_id, by_connect_code)."""
+        return tuple(await asyncio.gather(self.get_user(discord_id), self.get_user(connect_code)))
+
+    async def refresh_user(self, discord_id: int) -> tuple[ApiResponse, ApiResponse | None]:
+        """Creates a fresh stats entry for the user and re-reads them, (update, user).
+
+        The user is only re-read when the update succeeded.
+        """
+        update = await self.update_stats(discord_id)
+        if update.status_code != 201:
+            return update, None
+        return update, await self.get_user(discord_id)
+
+    async def get_leaderboard_entry(self, user_id: int) -> ApiResponse:
+        return await self._request('GET', '/rest/get_lbe/', params={'id': user_id})
+
+    async def get_leaderboard(self, offset: int | None = None, limit: int | None = None) -> ApiResponse:
+        """The whole board, or limit rows starting at offset when both are given."""
+        params = {'offset': offset, 'limit': limit} if offset is not None and limit is not None else None
+        return await self._request('GET', '/rest/get_leaderboard/', params=params)
+
+    async def get_latest_elo(self, user_id: int = 0) -> ApiResponse:
+        return await self._request('GET', f'/rest/elo/user/{user_id}/latest', '/rest/elo/user/{id}/latest')
+
+    async def get_elo_history(self, user_id: int) -> ApiResponse:
+        return await self._request('GET', f'/rest/elo/user/{user_id}', '/rest/elo/user/{id}')
+
+    async def update_stats(self, user_id: int) -> ApiResponse:
+        return await self._request('POST', '/rest/update/', params={'user_id': user_id}, headers=self.auth_headers)
+
+    async def get_elo_graph(self, user_id: int) -> ApiResponse:
+        return await self._request('GET', '/get_elo_graph', params={'id': user_id})
+
+    async def get_character_graph(self, user_id: int) -> ApiResponse:
+        return await self._request('GET', '/get_character_graph', params={'id': user_id})
+
+    async def get_graph_image(self, filename: str, max_bytes: int = graph_max_bytes) -> ApiResponse:
+        path = f'/static/images/graphs/{filename}'
+        logger.debug('GET %s', path)
+        async with andross_limiter.slot(), \
+                metrics.track_upstream('andross', 'GET /static/images/graphs/{filename}') as tracker, \
+                self.session.get(f'{self.base_url}{path}') as response:
+            tracker['status'] = response.status
+            if response.content_length and response.content_length > max_bytes:
+                raise ResponseTooLargeError(path, max_bytes)
+
+            content = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                content += chunk
+                if len(content) > max_bytes:
+                    raise ResponseTooLargeError(path, max_bytes)
+            return ApiResponse(response.status, bytes(content))
+
+
+andross_api = AndrossAPI()
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class AsyncTTLCache:
+    """Bounded LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent get_or_load calls for the same key share one in-flight load, so N waiters cost one upstream call.
+    When maxbytes is given, sizeof(value) is charged against it and least recently used entries are evicted
+    until the cache fits the budget again.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300,
+                 maxbytes: int | None = None, sizeof: Callable[[Any], int] = len):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.stats = CacheStats()
+        self.bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, count=False) is not None
+
+    def get(self, key: Hashable, count: bool = True):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            self.stats.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if count:
+            self.stats.hits += 1
+        return value
+
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self.maxbytes is not None:
+            self.bytes -= self.sizeof(entry[1])
+        return entry
+
+    def _over_budget(self) -> bool:
+        if len(self._entries) > self.maxsize:
+            return True
+        return self.maxbytes is not None and self.bytes > self.maxbytes
+
+    def set(self, key: Hashable, value, ttl: float | None = None):
+        self._pop(key)
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        if self.maxbytes is not None:
+            self.bytes += self.sizeof(value)
+        # Never evict the entry we just stored, even if it alone is over the byte budget
+        while len(self._entries) > 1 and self._over_budget():
+            self._pop(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def expires_in(self, key: Hashable) -> float | None:
+        """Seconds until key expires, None when it isn't cached."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return max(entry[0] - time.monotonic(), 0)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        for key in [key for key in self._entries if predicate(key)]:
+            self._pop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None = None):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats.misses += 1
+            task = asyncio.get_running_loop().create_task(self._load(key, loader, ttl))
+            self._inflight[key] = task
+        else:
+            self.stats.coalesced += 1
+
+        # shield so one cancelled caller doesn't cancel the load every other waiter is sharing
+        return await asyncio.shield(task)
+
+    async def refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None = None):
+        """Reloads key in place, the current value keeps being served and concurrent misses join this load."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(key, loader, ttl))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None):
+        try:
+            value = await loader()
+            # None means nothing was found upstream, don't pin that for a whole TTL
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def info(self) -> dict:
+        return {'name': self.name, 'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'bytes': self.bytes, 'maxbytes': self.maxbytes, 'inflight': len(self._inflight), **asdict(self.stats)}
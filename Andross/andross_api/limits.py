@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from os import getenv
+
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+# Set per command in bot.before_invoke, queued upstream calls are handed slots round-robin across guilds
+current_guild: ContextVar[int | None] = ContextVar('current_guild', default=None)
+
+
+class UpstreamBusyError(Exception):
+
+    def __init__(self, upstream: str, label: str):
+        super().__init__(f'{label} is busy right now, please try again in a moment')
+        self.upstream = upstream
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """Takes a token and returns how long to wait before using it, None if that would be longer than max_wait."""
+        self.refill()
+        wait = max(1 - self.tokens, 0) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+    def refund(self):
+        """Gives back a reserved token that ended up unused."""
+        self.tokens = min(self.tokens + 1, self.burst)
+
+
+class UpstreamLimiter:
+    """Token bucket plus concurrency cap for one upstream.
+
+    Callers first wait for a token, then for a slot. Callers over the concurrency cap queue per guild and are
+    admitted round-robin, so one busy guild can't starve the rest. Once max_queue callers are queued, or a caller
+    would wait longer than max_wait for its token, UpstreamBusyError is raised straight away instead.
+    """
+
+    def __init__(self, name: str, label: str, rate: float = 0, burst: int = 1, concurrency: int = 8,
+                 max_queue: int = 100, max_wait: float = 10):
+        self.name = name
+        self.label = label
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        # Callers waiting on the token bucket, they don't hold a slot yet
+        self.pacing = 0
+        self._waiters: OrderedDict[int | None, deque[asyncio.Future]] = OrderedDict()
+
+    @classmethod
+    def from_env(cls, name: str, label: str, **defaults) -> 'UpstreamLimiter':
+        """Reads {NAME}_RATE_LIMIT, {NAME}_BURST, {NAME}_CONCURRENCY, {NAME}_MAX_QUEUE and {NAME}_MAX_WAIT."""
+        prefix = name.upper()
+        return cls(name, label,
+                   rate=float(getenv(f'{prefix}_RATE_LIMIT', defaults.get('rate', 0))),
+                   burst=int(getenv(f'{prefix}_BURST', defaults.get('burst', 1))),
+                   concurrency=int(getenv(f'{prefix}_CONCURRENCY', defaults.get('concurrency', 8))),
+                   max_queue=int(getenv(f'{prefix}_MAX_QUEUE', defaults.get('max_queue', 100))),
+                   max_wait=float(getenv(f'{prefix}_MAX_WAIT', defaults.get('max_wait', 10))))
+
+    def _reject(self, reason: str) -> UpstreamBusyError:
+        metrics.inc('andross_upstream_rejected_total', upstream=self.name, reason=reason)
+        logger.warning('%s limiter rejected a call: %s, %d active, %d queued',
+                       self.name, reason, self.active, self.queued)
+        return UpstreamBusyError(self.name, self.label)
+
+    async def _acquire(self, max_wait: float):
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject('queue_full')
+
+        guild = current_guild.get()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(guild, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self._release()
+            else:
+                self._discard(guild, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject('timeout')
+            raise
+
+    def _discard(self, guild: int | None, waiter: asyncio.Future):
+        queue = self._waiters.get(guild)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.queued -= 1
+            if not queue:
+                del self._waiters[guild]
+
+    def _release(self):
+        while self._waiters:
+            guild, queue = self._waiters.popitem(last=False)
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                # Back of the line for this guild's next caller
+                self._waiters[guild] = queue
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def _pace(self) -> float:
+        """Reserves a token and sleeps until it's usable, returns how long that took."""
+        # reserve() refills first, so the fail fast decision is made on the current token count
+        wait = self.bucket.reserve(self.max_wait)
+        if wait is None:
+            raise self._reject('rate_limited')
+        if wait:
+            self.pacing += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.bucket.refund()
+                raise
+            finally:
+                self.pacing -= 1
+        return wait
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.queued >= self.max_queue:
+            raise self._reject('queue_full')
+        # Token first, a caller sleeping off the rate limit shouldn't be holding one of the concurrency slots
+        waited = await self._pace() if self.bucket else 0
+        try:
+            await self._acquire(max(self.max_wait - waited, 0))
+        except BaseException:
+            if self.bucket:
+                self.bucket.refund()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def info(self) -> dict:
+        return {'active': self.active, 'queued': self.queued, 'pacing': self.pacing, 'concurrency': self.concurrency,
+                'guilds_queued': len(self._waiters)}
+
+
+slippi_limiter = UpstreamLimiter.from_env('slippi', 'slippi.gg', rate=5, burst=10, concurrency=4, max_queue=200)
+andross_limiter = UpstreamLimiter.from_env('andross', 'The Andross API', concurrency=50, max_queue=500)
+render_limiter = UpstreamLimiter.from_env('render', 'Graph rendering', concurrency=os.cpu_count() or 2, max_queue=50,
+                                          max_wait=20)
+
+limiters = (slippi_limiter, andross_limiter, render_limiter)
+
+
+def _limiter_samples():
+    for limiter in limiters:
+        for stat, value in limiter.info().items():
+            yield 'andross_upstream_limiter', {'upstream': limiter.name, 'stat': stat}, value
+
+
+metrics.register_collector(_limiter_samples)
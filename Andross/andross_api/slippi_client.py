@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import getenv
+
+from slippi.slippi_user import SlippiUser
+
+from Andross.andross_api.cache import AsyncTTLCache
+from Andross.andross_api.limits import slippi_limiter
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+slippi_workers = int(getenv('SLIPPI_WORKERS', 4))
+slippi_timeout = float(getenv('SLIPPI_TIMEOUT', 10))
+profile_cache_size = int(getenv('PROFILE_CACHE_SIZE', 2048))
+profile_cache_ttl = float(getenv('PROFILE_CACHE_TTL', 120))
+
+
+def normalize_connect_code(connect_code: str) -> str:
+    return connect_code.strip().lower().replace('-', '#')
+
+
+class SlippiTimeoutError(Exception):
+
+    def __init__(self, connect_code: str):
+        super().__init__(f'slippi.gg took too long to respond for {connect_code}, please try again later')
+        self.connect_code = connect_code
+
+
+class AsyncSlippiAPI:
+    """Runs the blocking slippi_api client on a bounded thread pool so calls never stall the event loop."""
+
+    def __init__(self, max_workers: int = slippi_workers, timeout: float = slippi_timeout,
+                 cache_size: int = profile_cache_size, cache_ttl: float = profile_cache_ttl):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.profiles = AsyncTTLCache('slippi_profiles', maxsize=cache_size, ttl=cache_ttl)
+        # (connect code, is_max) -> when it was last asked for by a command, what the prefetcher keeps warm
+        self.recent: OrderedDict[tuple[str, bool], float] = OrderedDict()
+        self.recent_size = cache_size
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def client(self):
+        # slippi.main pulls in requests and builds its session on import, warm_up() does that on a worker thread
+        from slippi.main import slippi_api
+        return slippi_api
+
+    async def warm_up(self):
+        """Imports the slippi client off the loop, so the first command doesn't pay for it inline."""
+        await asyncio.get_running_loop().run_in_executor(self.executor, lambda: self.client)
+
+    def _call(self, method: str, *args):
+        # Runs on the worker thread, the client is only resolved there
+        return getattr(self.client, method)(*args)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='slippi')
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    async def _run(self, func, *args, timeout: float | None = None):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, partial(func, *args))
+        # wait_for cancels the executor future on timeout or when the calling task is cancelled,
+        # so queued calls that have not started yet are dropped instead of piling up
+        return await asyncio.wait_for(future, timeout=timeout or self.timeout)
+
+    async def _fetch_ranked_data(self, connect_code: str, is_max: bool, timeout: float | None) -> SlippiUser | None:
+        try:
+            async with slippi_limiter.slot(), metrics.track_upstream('slippi', 'get_player_ranked_data'):
+                return await self._run(self._call, 'get_player_ranked_data', connect_code, is_max, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning('get_player_ranked_data timed out: %s', connect_code)
+            raise SlippiTimeoutError(connect_code)
+
+    async def get_player_ranked_data(self, connect_code: str, is_max: bool = False,
+                                     timeout: float | None = None) -> SlippiUser | None:
+        connect_code = normalize_connect_code(connect_code)
+        key = (connect_code, is_max)
+        self._touch(key)
+        return await self.profiles.get_or_load(key, lambda: self._fetch_ranked_data(connect_code, is_max, timeout))
+
+    def _touch(self, key: tuple[str, bool]):
+        self.recent[key] = time.monotonic()
+        self.recent.move_to_end(key)
+        while len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    def recently_requested(self, window: float) -> list[tuple[str, bool]]:
+        """Keys asked for in the last window seconds, most recent first."""
+        cutoff = time.monotonic() - window
+        keys = []
+        for key, seen in reversed(self.recent.items()):
+            if seen < cutoff:
+                break
+            keys.append(key)
+        return keys
+
+    async def prefetch(self, connect_code: str, is_max: bool = False) -> SlippiUser | None:
+        """Reloads a profile into the cache without evicting the one commands are being served from meanwhile."""
+        connect_code = normalize_connect_code(connect_code)
+        return await self.profiles.refresh((connect_code, is_max),
+                                           lambda: self._fetch_ranked_data(connect_code, is_max, None))
+
+    async def is_valid_connect_code(self, connect_code: str) -> bool:
+        # Pure regex check, cheap enough that a thread hop would cost more than the call itself. The client is
+        # already imported by warm_up() from setup_hook
+        return self.client.is_valid_connect_code(connect_code)
+
+
+async_slippi_api = AsyncSlippiAPI()
+
+metrics.register_cache(async_slippi_api.profiles)
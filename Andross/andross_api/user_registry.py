@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from os import getenv
+
+from Andross.andross_api.andross_api import ApiResponse, andross_api
+from Andross.andross_api.slippi_client import normalize_connect_code
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+user_registry_path = getenv('USER_REGISTRY_PATH', 'user_registry.db')
+user_registry_ttl = float(getenv('USER_REGISTRY_TTL', 24 * 60 * 60))
+
+schema = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    cc TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    updated REAL NOT NULL
+)
+'''
+
+
+class UserRegistry:
+    """Local map of discord id and connect code to Andross user, persisted in SQLite so it survives restarts.
+
+    Only the identity fields (id, cc, name) are kept, get_user serves those locally and falls back to the API for
+    anything unknown or older than ttl. Shard processes can share the file, WAL mode keeps their reads from blocking
+    each other. Queries run in a worker thread, so waiting on another process's write lock never holds up the loop.
+    """
+
+    def __init__(self, path: str = user_registry_path, ttl: float = user_registry_ttl):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._connection: sqlite3.Connection | None = None
+        # The connection is shared by the worker threads, one at a time
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('PRAGMA busy_timeout=1000')
+            self._connection.execute(schema)
+            self._count()
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+
+    def _count(self):
+        self.size = self.connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    async def lookup(self, user: int | str) -> dict | None:
+        """The registered user for a discord id or connect code, None when unknown, stale or the file is locked."""
+        try:
+            return await asyncio.to_thread(self._lookup, user)
+        except sqlite3.OperationalError as e:
+            logger.warning('user registry lookup failed: %s', e)
+            return None
+
+    async def store(self, user: dict):
+        # The API stays the source of truth, a missed write only costs a later lookup
+        try:
+            await asyncio.to_thread(self._store, user)
+        except sqlite3.OperationalError as e:
+            logger.warning('user registry store failed: %s', e)
+
+    def _lookup(self, user: int | str) -> dict | None:
+        with self._lock:
+            if isinstance(user, int):
+                row = self.connection.execute('SELECT id, cc, name, updated FROM users WHERE id = ?',
+                                              (user,)).fetchone()
+            else:
+                row = self.connection.execute('SELECT id, cc, name, updated FROM users WHERE cc = ?',
+                                              (normalize_connect_code(user),)).fetchone()
+        if row is None or row['updated'] + self.ttl < time.time():
+            return None
+        return {'id': row['id'], 'cc': row['cc'], 'name': row['name']}
+
+    def _store(self, user: dict):
+        connect_code = normalize_connect_code(user['cc'])
+        with self._lock, self.connection:
+            # Connect codes are unique, whoever held this one before has since moved off it
+            self.connection.execute('DELETE FROM users WHERE cc = ? AND id != ?', (connect_code, user['id']))
+            self.connection.execute('INSERT INTO users (id, cc, name, updated) VALUES (?, ?, ?, ?) '
+                                    'ON CONFLICT (id) DO UPDATE SET cc = excluded.cc, name = excluded.name, '
+                                    'updated = excluded.updated',
+                                    (user['id'], connect_code, user['name'], time.time()))
+            self._count()
+
+    async def remember(self, response: ApiResponse) -> ApiResponse:
+        """Stores a /rest/user/ response's user when the lookup found one, returns the response unchanged."""
+        if response.status_code == 200:
+            user = response.json()
+            if user and user.get('id') is not None and user.get('cc'):
+                await self.store(user)
+        return response
+
+    async def get_user(self, user: int | str) -> ApiResponse:
+        """Drop-in for andross_api.get_user as far as id, cc and name are concerned."""
+        local_user = await self.lookup(user)
+        if local_user is not None:
+            self.hits += 1
+            return ApiResponse(200, json.dumps(local_user).encode())
+
+        self.misses += 1
+        return await self.remember(await andross_api.get_user(user))
+
+    def info(self) -> dict:
+        # Metrics scrapes run on the loop, report the count the worker threads last saw instead of querying
+        return {'name': 'user_registry', 'size': self.size, 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+user_registry = UserRegistry()
+
+metrics.register_cache(user_registry)
@@ -0,0 +1,243 @@
+"""Load benchmark for the cog command paths.
+
+Runs StatsCog, VisualizerCog and InfoCog commands against a local stand-in for the Andross API (configurable
+latency) with slippi.gg replaced by a stub, and reports throughput, latency percentiles and event loop lag.
+
+    PYTHONPATH=/Andross python benchmarks/bench_cogs.py -n 5000 -c 500 --api-latency 20 --slippi-latency 150
+
+Set LEADERBOARD_PAGINATION=server to exercise page window fetching instead of the full board.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+png_bytes = b'\x89PNG\r\n\x1a\n' + bytes(32 * 1024)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class StubApi:
+    """Mimics the /rest/... and graph endpoints the cogs use, every response is delayed by latency seconds."""
+
+    def __init__(self, latency: float, users: int, leaderboard_size: int):
+        self.latency = latency
+        self.users = users
+        self.leaderboard = [self.user(index) | {'position': index + 1} for index in range(leaderboard_size)]
+        self.requests = defaultdict(int)
+
+    @staticmethod
+    def user(index: int) -> dict:
+        return {'id': index, 'cc': f'user#{index}', 'name': f'user{index}'[:12], 'latest_elo': 1500.0 + index,
+                'latest_wins': 10 + index % 7, 'latest_losses': 8, 'latest_dgp': None}
+
+    async def _respond(self, request: web.Request, payload, status: int = 200) -> web.StreamResponse:
+        self.requests[request.match_info.route.resource.canonical] += 1
+        await asyncio.sleep(self.latency)
+        if isinstance(payload, bytes):
+            return web.Response(body=payload, status=status, content_type='image/png')
+        if isinstance(payload, str):
+            return web.Response(text=payload, status=status)
+        return web.json_response(payload, status=status)
+
+    async def get_user(self, request: web.Request):
+        key = request.match_info['key']
+        index = int(key.split('-')[-1]) if '-' in key else int(key)
+        if index >= self.users:
+            return await self._respond(request, {'error': 'not found'}, 404)
+        return await self._respond(request, self.user(index))
+
+    async def get_lbe(self, request: web.Request):
+        return await self._respond(request, {'position': int(request.query['id']) + 1})
+
+    async def get_leaderboard(self, request: web.Request):
+        if 'offset' in request.query:
+            offset = int(request.query['offset'])
+            return await self._respond(request, self.leaderboard[offset:offset + int(request.query['limit'])])
+        return await self._respond(request, self.leaderboard)
+
+    async def latest_elo(self, request: web.Request):
+        return await self._respond(request, {'entry_time': '2023-05-01 10:00:00.000000'})
+
+    async def elo_graph(self, request: web.Request):
+        return await self._respond(request, {'filename': f'elo_{request.query["id"]}.png',
+                                             'start_date': '2023-04-01', 'end_date': '2023-05-01'})
+
+    async def character_graph(self, request: web.Request):
+        return await self._respond(request, f'characters_{request.query["id"]}.png')
+
+    async def graph_image(self, request: web.Request):
+        return await self._respond(request, png_bytes)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/rest/user/{key}', self.get_user)
+        app.router.add_get('/rest/get_lbe/', self.get_lbe)
+        app.router.add_get('/rest/get_leaderboard/', self.get_leaderboard)
+        app.router.add_get('/rest/elo/user/0/latest', self.latest_elo)
+        app.router.add_get('/get_elo_graph', self.elo_graph)
+        app.router.add_get('/get_character_graph', self.character_graph)
+        app.router.add_get('/static/images/graphs/{filename}', self.graph_image)
+        return app
+
+
+def stub_slippi(latency: float):
+    """Replaces the slippi.gg GraphQL round trip with a blocking sleep, like the real client it runs off-loop."""
+    from slippi.main import slippi_api
+    from slippi.slippi_user import SlippiUser
+
+    def get_player_ranked_data(connect_code: str, is_max: bool = False):
+        time.sleep(latency)
+        profile = {'id': connect_code, 'ratingOrdinal': 1600.5, 'ratingUpdateCount': 40, 'wins': 30, 'losses': 20,
+                   'dailyGlobalPlacement': None, 'dailyRegionalPlacement': None, 'continent': 'NORTH_AMERICA',
+                   'characters': [{'character': 'FOX', 'gameCount': 40}, {'character': 'MARTH', 'gameCount': 10}]}
+        return SlippiUser({'data': {'getConnectCode': {'user': {
+            'displayName': connect_code.split('#')[0], 'connectCode': {'code': connect_code.upper()},
+            'rankedNetplayProfile': profile}}}})
+
+    slippi_api.get_player_ranked_data = get_player_ranked_data
+
+
+class FakeAuthor:
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.display_name = f'user{user_id}'
+
+
+class FakeContext:
+    """Just enough of commands.Context for the cog callbacks, sends are recorded instead of hitting Discord."""
+
+    def __init__(self, user_id: int, send_latency: float):
+        self.author = FakeAuthor(user_id)
+        self.guild = None
+        self.send_latency = send_latency
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent.append(content or kwargs.get('embed'))
+
+    async def send_help(self, *args):
+        self.sent.append(f'help {args}')
+
+
+class LoopLagMonitor:
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - started - self.interval, 0))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+async def run(args):
+    stub = StubApi(args.api_latency / 1000, args.users, args.leaderboard_size)
+    runner = web.AppRunner(stub.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+
+    from Andross.andross_api.andross_api import andross_api
+    from Andross.andross_api.slippi_client import async_slippi_api
+    from Andross.discord_bot.cogs.info import InfoCog
+    from Andross.discord_bot.cogs.stats import StatsCog
+    from Andross.discord_bot.cogs.visualizer import VisualizerCog
+
+    stats_cog, visualizer_cog, info_cog = StatsCog(None), VisualizerCog(None), InfoCog(None)
+    commands = {
+        'stats': lambda ctx, user: StatsCog._StatsCog__stats.callback(stats_cog, ctx, f'user#{user}'),
+        'user': lambda ctx, user: StatsCog._StatsCog__user.callback(stats_cog, ctx, f'user#{user}'),
+        'leaderboard': lambda ctx, user: StatsCog._StatsCog__leaderboard.callback(stats_cog, ctx, None),
+        'elo': lambda ctx, user: VisualizerCog._VisualizerCog__elo.callback(visualizer_cog, ctx, 'server'),
+        'git': lambda ctx, user: InfoCog._InfoCog__showGit.callback(info_cog, ctx),
+    }
+    selected = [name.strip() for name in args.commands.split(',')]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def invoke(name: str):
+        user = random.randrange(args.users)
+        ctx = FakeContext(user, args.send_latency / 1000)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await commands[name](ctx, user)
+            except Exception as e:
+                errors[f'{name}: {type(e).__name__}'] += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(invoke(random.choice(selected)) for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+
+    await andross_api.close()
+    async_slippi_api.close()
+    await runner.cleanup()
+
+    print(f'{args.requests} commands in {elapsed:.2f}s, {args.requests / elapsed:.1f} commands/s, '
+          f'concurrency {args.concurrency}')
+    print(f'{"command":<12} {"count":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    for name, values in sorted(latencies.items()):
+        print(f'{name:<12} {len(values):>7} {percentile(values, .5) * 1000:>9.1f} '
+              f'{percentile(values, .95) * 1000:>9.1f} {percentile(values, .99) * 1000:>9.1f} '
+              f'{max(values) * 1000:>9.1f}')
+    lags = monitor.lags
+    print(f'loop lag ms  p50 {percentile(lags, .5) * 1000:.2f}  p99 {percentile(lags, .99) * 1000:.2f}  '
+          f'max {max(lags, default=0) * 1000:.2f}  mean {statistics.fmean(lags) * 1000 if lags else 0:.2f}')
+    print(f'api requests {dict(stub.requests)}')
+    print(f'slippi cache {async_slippi_api.profiles.info()}')
+    for error, count in errors.items():
+        print(f'error {error}: {count}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load benchmark for the Andross cogs.')
+    parser.add_argument('-n', '--requests', type=int, default=2000, help='Total commands to run')
+    parser.add_argument('-c', '--concurrency', type=int, default=200, help='Commands in flight at once')
+    parser.add_argument('--commands', default='stats,user,leaderboard,elo', help='Comma separated command mix')
+    parser.add_argument('--users', type=int, default=500, help='Distinct registered users to spread commands over')
+    parser.add_argument('--leaderboard-size', type=int, default=1000)
+    parser.add_argument('--api-latency', type=float, default=20, help='Stub Andross API latency in ms')
+    parser.add_argument('--slippi-latency', type=float, default=150, help='Stub slippi.gg latency in ms')
+    parser.add_argument('--send-latency', type=float, default=0, help='Simulated Discord send latency in ms')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    # Point the API client at the stub before anything imports it
+    os.environ['API_URL'] = f'127.0.0.1:{args.port}'
+    os.environ.setdefault('USER_REGISTRY_PATH', ':memory:')
+    stub_slippi(args.slippi_latency / 1000)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
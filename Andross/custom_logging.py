@@ -1,8 +1,25 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import sys
+from os import getenv
 
 
 format_string = '%(asctime)s - %(name)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d)'
 
+log_level = getenv('LOG_LEVEL', 'DEBUG').upper()
+discord_log_level = getenv('DISCORD_LOG_LEVEL', 'INFO').upper()
+log_file = getenv('LOG_FILE', 'log.log')
+log_rotation = getenv('LOG_ROTATION', 'size')
+log_max_bytes = int(getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+log_backup_count = int(getenv('LOG_BACKUP_COUNT', 5))
+log_when = getenv('LOG_WHEN', 'midnight')
+log_format = getenv('LOG_FORMAT', 'text')
+
+
 class CustomFormatter(logging.Formatter):
 
     grey = "\x1b[38;20m"
@@ -20,7 +37,81 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + format + reset
     }
 
+    # Built once instead of per record
+    FORMATTERS = {level: logging.Formatter(log_fmt) for level, log_fmt in FORMATS.items()}
+
+    def format(self, record):
+        formatting = self.FORMATTERS.get(record.levelno) or self.FORMATTERS[logging.DEBUG]
+        return formatting.format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line, command records carry their latency fields as top level keys."""
+
+    fields = ('command', 'guild', 'user', 'shard', 'outcome', 'elapsed_ms')
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatting = logging.Formatter(log_fmt)
-        return formatting.format(record)
\ No newline at end of file
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in self.fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a listener in the same process.
+
+    The stock prepare() flattens the traceback into msg and drops exc_info, so formatters behind the listener can't
+    tell there was one. Only the message is merged here, the traceback is left for them to format off the loop.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def _file_handler() -> logging.Handler:
+    if log_rotation == 'time':
+        return logging.handlers.TimedRotatingFileHandler(log_file, when=log_when, backupCount=log_backup_count)
+    if log_rotation == 'size':
+        return logging.handlers.RotatingFileHandler(log_file, maxBytes=log_max_bytes, backupCount=log_backup_count)
+    return logging.FileHandler(log_file)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Routes the andross and discord loggers through a queue, the stdout and file handlers run on a background
+    listener thread.
+
+    Callers only pay for putting the record on the queue, none of the stream or file I/O happens on the event loop.
+    """
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    file_handler = _file_handler()
+    if log_format == 'json':
+        stdout_handler.setFormatter(JsonFormatter())
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        stdout_handler.setFormatter(CustomFormatter())
+        file_handler.setFormatter(logging.Formatter(format_string))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    for name, level in (('andross', log_level), ('discord', discord_log_level)):
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, stdout_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
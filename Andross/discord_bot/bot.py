@@ -1,15 +1,64 @@
+import asyncio
+import importlib
+import math
 import os
+import time
 from random import choice
-import requests
 
 import logging
 
 import discord
 from discord.ext import commands, tasks
 
+from Andross.andross_api.andross_api import andross_api
+from Andross.andross_api.limits import UpstreamBusyError, current_guild
+from Andross.andross_api.slippi_client import SlippiTimeoutError, async_slippi_api
+from Andross.andross_api.user_registry import user_registry
+from Andross.discord_bot.intents import footprint, gateway_event_stats, intents_config, record_gateway_event
+from Andross.discord_bot.prefetch import ranked_prefetcher
+from Andross.discord_bot.reloader import ExtensionBusyError, extension_reloader
+from Andross.discord_bot.sharding import shard_config, shard_metrics
+from Andross.discord_bot.watchdog import loop_watchdog
+from Andross.metrics import metrics, start_metrics_server
+
 logger = logging.getLogger(f'andross.{__name__}')
 
-bot = commands.Bot(command_prefix=os.environ.get('DISCORD_COMMAND_PREFIX'), intents=discord.Intents.all())
+
+class TimedContext(commands.Context):
+
+    async def send(self, *args, **kwargs):
+        async with metrics.track_upstream('discord', 'send'):
+            return await super().send(*args, **kwargs)
+
+
+class AndrossBot(commands.AutoShardedBot):
+    metrics_runner = None
+
+    async def setup_hook(self):
+        self.metrics_runner = await start_metrics_server()
+        # Runs once per process, unlike on_ready which fires again after every reconnect
+        await asyncio.gather(load_extensions(self), async_slippi_api.warm_up())
+
+    async def get_context(self, origin, /, *, cls=TimedContext):
+        return await super().get_context(origin, cls=cls)
+
+    async def invoke(self, ctx: commands.Context):
+        # Stamped here rather than in on_command so argument conversion is part of the measured time
+        ctx.started_at = time.perf_counter()
+        await super().invoke(ctx)
+
+    async def close(self):
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        loop_watchdog.stop()
+        ranked_prefetcher.run.cancel()
+        await andross_api.close()
+        async_slippi_api.close()
+        user_registry.close()
+        await super().close()
+
+
+bot = AndrossBot(command_prefix=os.environ.get('DISCORD_COMMAND_PREFIX'), **intents_config(), **shard_config())
 
 extensions_list = [
     'info',
@@ -17,6 +66,40 @@ extensions_list = [
     'visualizer'
 ]
 
+
+async def load_extension(bot: commands.Bot, extension: str) -> dict | None:
+    name = f'discord_bot.cogs.{extension}'
+    if name in bot.extensions:
+        return None
+
+    # Importing the module in a worker thread pulls in its dependencies off the event loop and alongside the
+    # other extensions, load_extension then only re-executes the cog module itself
+    started = time.perf_counter()
+    await asyncio.to_thread(importlib.import_module, name)
+    imported = time.perf_counter()
+    await bot.load_extension(name)
+    loaded = time.perf_counter()
+
+    timings = {'import': imported - started, 'load': loaded - imported}
+    for phase, seconds in timings.items():
+        metrics.gauge_set('andross_extension_load_seconds', seconds, extension=extension, phase=phase)
+    return timings
+
+
+async def load_extensions(bot: commands.Bot):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(load_extension(bot, extension) for extension in extensions_list),
+                                   return_exceptions=True)
+    for extension, result in zip(extensions_list, results):
+        if isinstance(result, Exception):
+            logger.error('Failed to load extension %s\n%s: %s', extension, type(result).__name__, result)
+        elif result:
+            logger.info('loaded extension %s: import %.1fms, load %.1fms',
+                        extension, result['import'] * 1000, result['load'] * 1000)
+
+    logger.info('Extensions loaded in %.1fms: %s', (time.perf_counter() - started) * 1000, ', '.join(bot.cogs))
+
+
 status_messages = [
     'Slippi'
     'Slippi ranked'
@@ -30,24 +113,153 @@ async def change_status():
                                                         name=choice(status_messages)))
 
 
+@tasks.loop(minutes=5)
+async def report_shard_metrics():
+    # Walking the guild cache for the footprint isn't free, skip it all when INFO is filtered out
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    for shard in shard_metrics.snapshot(bot.latencies):
+        logger.info('shard metrics: %s', shard)
+    logger.info('footprint: %s', footprint(bot))
+    logger.info('event loop lag: %s', loop_watchdog.lag_percentiles())
+
+
+if gateway_event_stats:
+    @bot.event
+    async def on_socket_event_type(event_type: str):
+        record_gateway_event(event_type)
+
+
 @bot.event
-async def on_ready():
+async def on_shard_connect(shard_id: int):
+    shard_metrics.connects[shard_id] += 1
+
+
+@bot.event
+async def on_shard_disconnect(shard_id: int):
+    shard_metrics.disconnects[shard_id] += 1
+    logger.warning('Shard %s disconnected', shard_id)
+
+
+@bot.event
+async def on_shard_resumed(shard_id: int):
+    shard_metrics.resumes[shard_id] += 1
 
-    for extension in extensions_list:
+
+@bot.listen()
+async def on_message(message: discord.Message):
+    shard_metrics.record_event(message.guild.shard_id if message.guild else 0)
+
+
+@bot.listen()
+async def on_interaction(interaction: discord.Interaction):
+    shard_metrics.record_event(interaction.guild.shard_id if interaction.guild else 0)
+
+
+def _shard_samples():
+    for shard_id, latency in bot.latencies:
+        if math.isfinite(latency):
+            yield 'andross_shard_latency_seconds', {'shard': shard_id}, latency
+        yield 'andross_shard_events', {'shard': shard_id}, shard_metrics.events[shard_id]
+
+
+def _loop_lag_samples():
+    for stat, value in loop_watchdog.lag_percentiles().items():
+        yield 'andross_loop_lag', {'stat': stat}, value
+
+
+metrics.register_collector(_shard_samples)
+metrics.register_collector(_loop_lag_samples)
+
+
+@bot.before_invoke
+async def before_command(ctx: commands.Context):
+    # Raises while the command's extension is being reloaded, before anything below counts it as started
+    extension_reloader.command_started(ctx)
+    current_guild.set(ctx.guild.id if ctx.guild else None)
+    metrics.gauge_add('andross_command_inflight', 1, command=ctx.command.qualified_name)
+    loop_watchdog.command_started(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def after_command(ctx: commands.Context):
+    command = ctx.command.qualified_name
+    extension_reloader.command_finished(ctx)
+    loop_watchdog.command_finished()
+    metrics.gauge_add('andross_command_inflight', -1, command=command)
+    metrics.observe('andross_command_duration_seconds', time.perf_counter() - ctx.started_at, command=command)
+
+
+def log_command(ctx: commands.Context, outcome: str):
+    started = getattr(ctx, 'started_at', None)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+    command = ctx.command.qualified_name if ctx.command else None
+    metrics.inc('andross_commands_total', command=command, outcome=outcome)
+    logger.info('command %s %s in %sms', command, outcome, elapsed_ms,
+                extra={'command': command,
+                       'guild': ctx.guild.id if ctx.guild else None,
+                       'user': ctx.author.id,
+                       'shard': ctx.guild.shard_id if ctx.guild else 0,
+                       'outcome': outcome,
+                       'elapsed_ms': elapsed_ms})
+
+
+@bot.listen()
+async def on_command_completion(ctx: commands.Context):
+    log_command(ctx, 'ok')
+
+
+# Raised by commands under load, already logged where they happen and answered by the cogs
+expected_errors = (UpstreamBusyError, SlippiTimeoutError)
+
+
+@bot.listen()
+async def on_command_error(ctx: commands.Context, error: commands.CommandError):
+    if isinstance(error, commands.CommandInvokeError):
+        error = error.original
+        # Being a listener stops discord.py's default handler from printing the traceback, log it here instead
+        if not isinstance(error, expected_errors):
+            logger.error('Command %s raised %s: %s', ctx.command, type(error).__name__, error, exc_info=error)
+    log_command(ctx, type(error).__name__)
+
+
+@bot.command(name='reload', hidden=True, help='Reloads a cog (or all of them) without restarting the bot')
+@commands.is_owner()
+async def reload_extensions(ctx: commands.Context, extension: str = 'all'):
+    extensions = extensions_list if extension == 'all' else [extension]
+    if any(name not in extensions_list for name in extensions):
+        await ctx.send(f'Unknown extension {extension}, expected one of: all, {", ".join(extensions_list)}')
+        return
+
+    results = []
+    for name in extensions:
         try:
-            logger.info(f'loading extension {extension}')
-            await bot.load_extension(f'discord_bot.cogs.{extension}')
-        except Exception as e:
-            exc = '{}: {}'.format(type(e).__name__, e)
-            logger.error('Failed to load extension {}\n{}'.format(extension, exc))
+            elapsed = await extension_reloader.reload(bot, f'discord_bot.cogs.{name}')
+            results.append(f'{name}: reloaded in {elapsed * 1000:.0f}ms')
+        except ExtensionBusyError as e:
+            results.append(f'{name}: not reloaded, {e}')
+        except commands.ExtensionError as e:
+            logger.error('Failed to reload extension %s\n%s: %s', name, type(e).__name__, e)
+            results.append(f'{name}: failed, {type(e).__name__}: {e}')
+    await ctx.send('```' + '\n'.join(results) + '```')
+
 
-    logger.info('Extensions loaded')
-    for cog in bot.cogs:
-        logger.info(cog)
+@bot.event
+async def on_ready():
 
     # set bot status to online and game it is playing
     await bot.change_presence(status=discord.Status.online,
                               activity=discord.Activity(type=discord.ActivityType.playing, name='Slippi'))
 
-    logger.info(f'Logging in as: {bot.user.name} | {bot.user.id}')
+    if not report_shard_metrics.is_running():
+        report_shard_metrics.start()
+
+    if not ranked_prefetcher.run.is_running():
+        ranked_prefetcher.run.start()
+
+    # on_ready fires again after reconnects, start() is a no-op while it's already running
+    loop_watchdog.start()
+
+    logger.info('Logging in as: %s | %s', bot.user.name, bot.user.id)
+    logger.info('Shards: %s of %s', bot.shard_ids or list(range(bot.shard_count or 1)), bot.shard_count)
 
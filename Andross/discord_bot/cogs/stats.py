@@ -1,17 +1,18 @@
+import asyncio
 import logging
-import math
-import requests
-from datetime import datetime, timezone
 
 import discord
-from discord.ext import commands
-from zoneinfo import ZoneInfo
-from slippi.main import slippi_api
-from slippi.slippi_ranks import get_rank
+from discord.ext import commands, tasks
 
 from Andross.discord_bot.cogs.utils.colors import slippi_green
-from Andross.discord_bot.cogs.utils.views import UserStatsView
-from Andross.andross_api.andross_api import api_url, authorization_header
+from Andross.discord_bot.cogs.utils.graphs import invalidate_user_graphs
+from Andross.discord_bot.cogs.utils.leaderboard import leaderboard_service
+from Andross.discord_bot.cogs.utils.ranks import rank_table
+from Andross.discord_bot.cogs.utils.views import LeaderboardView, UserStatsView, dispatch_interaction
+from Andross.andross_api.andross_api import andross_api
+from Andross.andross_api.limits import UpstreamBusyError
+from Andross.andross_api.slippi_client import async_slippi_api
+from Andross.andross_api.user_registry import user_registry
 
 logger = logging.getLogger(f'andross.{__name__}')
 
@@ -25,85 +26,40 @@ namestr_paramater = commands.parameter(default=lambda ctx: ctx.author.display_na
                                        description=namestr_description)
 
 
-def format_leaderboard(leaderboard: dict) -> list[str]:
-    def generate_whitespace(n):
-        return " " * n
-
-    leaderboard_text = []
-    counter = 0
-    for entry in leaderboard:
-        logger.debug(f'entry: {entry}')
-        counter += 1
-        base_whitespace = 13
-        whitespace_amount_front = 2 if counter <= 9 else 1
-        whitespace_amount = (base_whitespace - len(entry['name']))
-        if not entry['latest_wins'] and not entry['latest_losses']:
-            rank_name = 'None'
-        elif (int(entry['latest_wins']) + int(entry['latest_losses'])) < 5:
-            rank_name = 'Pending'
-        else:
-            rank_name = get_rank(entry['latest_elo'], entry['latest_dgp'])
-        leaderboard_text.append(f"{entry['position']}."
-                                f"{generate_whitespace(whitespace_amount_front)}{entry['name']}"
-                                f"{generate_whitespace(whitespace_amount)}"
-                                f"| {format(entry['latest_elo'], '.1f')} "
-                                f"({entry['latest_wins']}/{entry['latest_losses']}) "
-                                f"{rank_name}")
-    return leaderboard_text
-
-
-class LeaderboardView(discord.ui.View):
-
-    def __init__(self, embed: discord.Embed, leaderboard: list[str], date: str, pages: int, cur_page: int):
-        super().__init__(timeout=180)
-        self.embed = embed
-        self.leaderboard = leaderboard
-        self.date = date
-        self.pages = pages
-        self.cur_page = cur_page
-
-    @discord.ui.button(emoji='⬅️', style=discord.ButtonStyle.green)
-    async def button_callback_left(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.cur_page:
-            self.cur_page -= 1
-        else:
-            self.cur_page = self.pages - 1
-
-        page_start = self.cur_page * 10
-        page_end = page_start + 10
-        embed_text = '\n'.join([x for x in self.leaderboard[page_start:page_end]])
-
-        self.embed.description = f'```{embed_text}```'
-        await interaction.response.edit_message(embed=self.embed)
-
-    @discord.ui.button(emoji='➡️', style=discord.ButtonStyle.green)
-    async def button_callback_right(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.cur_page < self.pages - 1:
-            self.cur_page += 1
-        else:
-            self.cur_page = 0
+class StatsCog(commands.Cog, name='Stats'):
 
-        page_start = self.cur_page * 10
-        page_end = page_start + 10
-        embed_text = '\n'.join([x for x in self.leaderboard[page_start:page_end]])
+    def __init__(self, bot):
+        self.bot = bot
 
-        self.embed.description = f'```{embed_text}```'
-        await interaction.response.edit_message(embed=self.embed)
+    async def cog_load(self):
+        self.refresh_leaderboard.start()
 
+    async def cog_unload(self):
+        self.refresh_leaderboard.cancel()
 
-class StatsCog(commands.Cog, name='Stats'):
+    @tasks.loop(minutes=2)
+    async def refresh_leaderboard(self):
+        try:
+            await leaderboard_service.refresh()
+        except Exception as e:
+            logger.error('refresh_leaderboard: %s: %s', type(e).__name__, e)
 
-    def __init__(self, bot):
-        self.bot = bot
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Leaderboard buttons and character dropdowns, including ones on messages from before a restart
+        await dispatch_interaction(interaction)
 
     async def cog_command_error(self, ctx: commands.Context, error: commands.CommandError):
+        if isinstance(error, commands.CommandInvokeError) and isinstance(error.original, UpstreamBusyError):
+            await ctx.send(str(error.original))
+            return
         logger.error(f'{error}')
 
         await ctx.send(f'An error occurred: {error}')
 
     @commands.command(name='user', help='In-depth stats display')
     async def __user(self, ctx: commands.Context, user_info: discordMemberStr = memberstr_parameter):
-        logger.info(f'__user: {ctx}, {user_info}')
+        logger.info('__user: %s, %s', ctx, user_info)
 
         user_id = 0
         cc = ''
@@ -117,7 +73,7 @@ class StatsCog(commands.Cog, name='Stats'):
         if isinstance(user_info, discord.Member):
             user_id = user_info.id
 
-        response = requests.get(f'{api_url}/rest/user/{cc.replace("#", "-") if is_cc else user_id}')
+        response = await user_registry.get_user(cc if is_cc else user_id)
         local_user = response.json()
         if response.status_code == 404 and not is_cc:
             await ctx.send('Unable to get your info from database, please provide a connect_code or register with '
@@ -125,17 +81,14 @@ class StatsCog(commands.Cog, name='Stats'):
             await ctx.send_help('reg')
             return
 
-        ranked_data = slippi_api.get_player_ranked_data(cc if is_cc else local_user['cc'])
-        if not ranked_data.ranked_profile.id:
+        ranked_data = await async_slippi_api.get_player_ranked_data(cc if is_cc else local_user['cc'])
+        if not ranked_data or not ranked_data.ranked_profile.id:
             await ctx.send('Unable to get your stats from slippi.gg')
             return
 
         if local_user:
-            response = requests.get(f'{api_url}/rest/get_lbe/', params={'id': local_user['id']})
-            if response.status_code == 200:
-                user_placement = response.json()['position']
-            else:
-                user_placement = 0
+            placement = await leaderboard_service.placement(local_user['id'])
+            user_placement = placement.position if placement else 0
         else:
             user_placement = ranked_data.ranked_profile.daily_regional_placement
 
@@ -164,11 +117,11 @@ class StatsCog(commands.Cog, name='Stats'):
         user_embed.add_field(name='Loses', value=losses)
         user_embed.add_field(name='Win-rate', value=f'{win_rate:.2f}%')
 
-        await ctx.send(view=UserStatsView(ctx, user_embed, ranked_data), embed=user_embed)
+        await ctx.send(view=UserStatsView(ranked_data), embed=user_embed)
 
     @commands.command(name='stats', help='Simple stats display')
     async def __stats(self, ctx: commands.Context, user_info: discordMemberStr = memberstr_parameter):
-        logger.info(f'__stats: {ctx}, {user_info}')
+        logger.info('__stats: %s, %s', ctx, user_info)
 
         user_id = 0
         cc = ''
@@ -181,7 +134,7 @@ class StatsCog(commands.Cog, name='Stats'):
         if isinstance(user_info, discord.Member):
             user_id = user_info.id
 
-        response = requests.get(f'{api_url}/rest/user/{cc.replace("#", "-") if is_cc else user_id}',)
+        response = await user_registry.get_user(cc if is_cc else user_id)
         local_user = None if is_cc else response.json()
         if response.status_code == 404 and not is_cc:
             await ctx.send('Unable to get your info from database, please provide a connect_code or register with '
@@ -189,8 +142,8 @@ class StatsCog(commands.Cog, name='Stats'):
             await ctx.send_help('reg')
             return
 
-        ranked_data = slippi_api.get_player_ranked_data(cc if is_cc else local_user['cc'])
-        if not ranked_data.ranked_profile.id:
+        ranked_data = await async_slippi_api.get_player_ranked_data(cc if is_cc else local_user['cc'])
+        if not ranked_data or not ranked_data.ranked_profile.id:
             await ctx.send('Was unable to get your stats from slippi.gg, please try again or check your info')
             return
 
@@ -212,9 +165,9 @@ class StatsCog(commands.Cog, name='Stats'):
 
     @commands.command(name='edit_user', help='Edits a users info for the bot')
     async def __edit_user(self, ctx: commands.Context, user_connect_code: str, name: str = namestr_paramater):
-        logger.info(f'__edit_user: {ctx}, {user_connect_code}, {name}')
+        logger.info('__edit_user: %s, %s, %s', ctx, user_connect_code, name)
 
-        if not slippi_api.is_valid_connect_code(user_connect_code.lower()):
+        if not await async_slippi_api.is_valid_connect_code(user_connect_code.lower()):
             await ctx.send(f'You\'ve entered a invalid connect code, please enter a valid connect code')
             await ctx.send_help('reg')
             return
@@ -226,37 +179,31 @@ class StatsCog(commands.Cog, name='Stats'):
 
         user_connect_code = user_connect_code.lower()
 
-        response = requests.get(f'{api_url}/rest/user/{ctx.author.id}')
-        if response.status_code == 404:
+        id_response, response = await andross_api.resolve_user(ctx.author.id, user_connect_code)
+        if id_response.status_code == 404:
             await ctx.send(f'You\'re not registered. Please register with the $reg command instead.')
             await ctx.send_help('reg')
             return
 
-        response = requests.get(f'{api_url}/rest/user/{user_connect_code.replace("#", "-")}')
-        if response == 200 and ctx.author.id != response.json()['id']:
+        if response.status_code == 200 and ctx.author.id != response.json()['id']:
             await ctx.send(f'{user_connect_code} is already being used by {response.json()["name"]}. '
                            f'Please enter a different one.')
             return
 
-        post_parameters = {
-            'cc': user_connect_code,
-            'name': name,
-            }
-        response = requests.post(f'{api_url}/rest/user/{ctx.author.id}',
-                                 params=post_parameters,
-                                 headers=authorization_header
-                                 )
+        response = await andross_api.post_user(ctx.author.id, user_connect_code, name)
         if response.status_code != 201:
             await ctx.send('Unable to update user, please try again later.')
             return
+        await user_registry.store({'id': ctx.author.id, 'cc': user_connect_code, 'name': name})
+        invalidate_user_graphs(ctx.author.id)
 
         await ctx.send('Your information has now been updated.')
 
     @commands.command(name='reg', help='Registers a user for the bot')
     async def __reg_user(self, ctx: commands.Context, user_connect_code: str, name: str = namestr_paramater):
-        logger.info(f'__reg_user: {ctx}, {user_connect_code}, {name}')
+        logger.info('__reg_user: %s, %s, %s', ctx, user_connect_code, name)
 
-        if not slippi_api.is_valid_connect_code(user_connect_code.lower()):
+        if not await async_slippi_api.is_valid_connect_code(user_connect_code.lower()):
             await ctx.send(f'You\'ve entered a invalid connect code, please enter a valid connect code')
             await ctx.send_help('reg')
             return
@@ -272,48 +219,44 @@ class StatsCog(commands.Cog, name='Stats'):
 
         user_connect_code = user_connect_code.lower()
 
-        response = requests.get(f'{api_url}/rest/user/{ctx.author.id}')
-        if response.status_code != 404:
-            id_check = response.json()
+        id_response, cc_response = await andross_api.resolve_user(ctx.author.id, user_connect_code)
+        if id_response.status_code != 404:
+            id_check = id_response.json()
             await ctx.send(f'You\'ve already created an account your connect code is {id_check["cc"]}')
             return
-        elif response.status_code != 200 and response.status_code != 404:
+        elif id_response.status_code != 200 and id_response.status_code != 404:
             await ctx.send(f'Unknown error occurred, try again or ping soph')
             return
 
-        response = requests.get(f'{api_url}/rest/user/{user_connect_code.replace("#", "-")}')
-        if response.status_code != 404:
-            cc_check = response.json()
+        if cc_response.status_code != 404:
+            cc_check = cc_response.json()
             await ctx.send(f'{user_connect_code} is already being used by {cc_check["name"]}. '
                            f'Please enter a different one.')
             return
-        elif response.status_code != 200 and response.status_code != 404:
+        elif cc_response.status_code != 200 and cc_response.status_code != 404:
             await ctx.send(f'Unknown error occurred, try again or ping soph')
             return
 
-        post_parameters = {
-            'cc': user_connect_code,
-            'name': name,
-        }
-        response = requests.post(f'{api_url}/rest/user/{ctx.author.id}', params=post_parameters, headers=authorization_header)
+        response = await andross_api.post_user(ctx.author.id, user_connect_code, name)
         if response.status_code != 201:
             await ctx.send(f'Unable to create user, please try again later.')
             return
+        await user_registry.store({'id': ctx.author.id, 'cc': user_connect_code, 'name': name})
 
-        await ctx.send('Thank you for registering, we will now get your stats for you')
-
-        # Attempt to create stats entry for user
-        response = requests.post(f'{api_url}/rest/update/', params={'user_id': ctx.author.id}, headers=authorization_header)
+        # Attempt to create stats entry for user while the thank-you goes out
+        _, (response, user_response) = await asyncio.gather(
+            ctx.send('Thank you for registering, we will now get your stats for you'),
+            andross_api.refresh_user(ctx.author.id))
         if response.status_code == 201:
+            invalidate_user_graphs(ctx.author.id)
             await ctx.send('Updated your stats.')
 
-            response = requests.get(f'{api_url}/rest/user/{ctx.author.id}')
-            user = response.json()
-            if response.status_code == 200:
+            user = user_response.json()
+            if user_response.status_code == 200:
                 await ctx.send(f'```'
                                f'{user["name"]} ({user["cc"].upper()})\n'
                                f'{user["latest_elo"]:.2f} | ({user["latest_wins"]}/{user["latest_losses"]}) | '
-                               f'{get_rank(user["latest_elo"], user["latest_dgp"])}'
+                               f'{rank_table.rank_name(user["latest_elo"], user["latest_dgp"])}'
                                f'```')
                 return
 
@@ -324,11 +267,9 @@ class StatsCog(commands.Cog, name='Stats'):
     async def __leaderboard(self, ctx: commands.Context,
                             focus_me: bool | discord.Member =
                             commands.parameter(default=None, description=memberbool_description)):
-        logger.info(f'__leaderboard: {focus_me}')
+        logger.info('__leaderboard: %s', focus_me)
 
         focus_user = 0
-        user_index = 0
-        latest_date = None
 
         if focus_me:
             if isinstance(focus_me, discord.Member):
@@ -336,48 +277,27 @@ class StatsCog(commands.Cog, name='Stats'):
             else:
                 focus_user = ctx.author.id
 
-        response = requests.get(f'{api_url}/rest/get_leaderboard/')
-        if response.status_code != 200:
-            await ctx.send('Unable to get leaderboard please try again')
-            return
-        leaderboard = response.json()
-
-        response = requests.get(f'{api_url}/rest/elo/user/0/latest')
-        if response.status_code != 200:
-            logger.warning('Unable to get latest date')
-        else:
-            latest_date = datetime.strptime(response.json()['entry_time'], '%Y-%m-%d %H:%M:%S.%f')\
-                .replace(tzinfo=ZoneInfo('UTC'))
-
-        leaderboard = format_leaderboard(leaderboard)
-        logger.debug(f'leaderboard: {ctx.author}, {focus_me}')
-
-        if latest_date:
-            string_date = latest_date.astimezone(
-                tz=ZoneInfo('America/Detroit')).strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            string_date = 'Failed to get date'
-
-        pages = math.ceil(len(leaderboard) / 10)
         cur_page = 0
 
-        page_start = cur_page * 10
-        page_end = page_start + 10
-
-        if focus_me:
-            cur_page = math.ceil(user_index / 10)
-            if cur_page:
-                cur_page -= 1
+        if focus_user:
+            placement = await leaderboard_service.placement(focus_user)
+            if placement:
+                cur_page = placement.page
+            else:
+                logger.debug('leaderboard: %s is not on the leaderboard', focus_user)
 
-        inital_description = '\n'.join([x for x in leaderboard[page_start:page_end]])
+        lb_page = await leaderboard_service.page(cur_page)
+        if not lb_page:
+            await ctx.send('Unable to get leaderboard please try again')
+            return
+        logger.debug('leaderboard: %s, %s', ctx.author, focus_me)
 
         lb_embed = discord.Embed(title='Leaderboard',
-                                 description=f'```{inital_description}```', colour=slippi_green,
+                                 description=f'```{lb_page.text}```', colour=slippi_green,
                                  url=f'https://andross.dev/leaderboard')
         lb_embed.set_thumbnail(url='https://avatars.githubusercontent.com/u/45867030?s=200&v=4')
-        lb_embed.set_footer(text=string_date)
-        lb_view = LeaderboardView(lb_embed, leaderboard, string_date, pages, 0)
-        await ctx.send(view=lb_view, embed=lb_embed)
+        lb_embed.set_footer(text=lb_page.date)
+        await ctx.send(view=LeaderboardView(lb_page), embed=lb_embed)
 
 
 async def setup(bot: commands.Bot):
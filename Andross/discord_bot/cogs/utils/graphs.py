@@ -0,0 +1,165 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from os import getenv
+
+import discord
+from slippi.slippi_characters import SlippiCharacterColors
+
+from Andross.andross_api.andross_api import andross_api
+from Andross.andross_api.cache import AsyncTTLCache
+from Andross.andross_api.limits import render_limiter
+from Andross.andross_api.slippi_client import async_slippi_api
+from Andross.discord_bot.cogs.utils.leaderboard import leaderboard_service
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+graph_freshness = float(getenv('GRAPH_FRESHNESS', 60))
+graph_cache_ttl = float(getenv('GRAPH_CACHE_TTL', 6 * 60 * 60))
+graph_cache_bytes = int(getenv('GRAPH_CACHE_BYTES', 64 * 1024 * 1024))
+graph_render_mode = getenv('GRAPH_RENDER_MODE', 'server')
+graph_render_workers = int(getenv('GRAPH_RENDER_WORKERS', os.cpu_count() or 2))
+render_modes = ('server', 'local')
+
+graph_cache = AsyncTTLCache('graphs', maxsize=4096, ttl=graph_cache_ttl,
+                            maxbytes=graph_cache_bytes, sizeof=lambda graph: len(graph.content))
+metrics.register_cache(graph_cache)
+
+_render_pool: ProcessPoolExecutor | None = None
+
+
+@dataclass(frozen=True)
+class GraphImage:
+    content: bytes
+    start_date: str = ''
+    end_date: str = ''
+
+    def to_file(self, filename: str) -> discord.File:
+        # Fresh buffer per send, discord.File consumes the stream it's given
+        return discord.File(io.BytesIO(self.content), filename=filename)
+
+
+async def _download(filename: str) -> bytes | None:
+    response = await andross_api.get_graph_image(filename)
+    if response.status_code != 200:
+        logger.warning('Unable to download graph %s: %s', filename, response.status_code)
+        return None
+    return response.content
+
+
+async def _load_elo_graph(user_id: int) -> GraphImage | None:
+    response = await andross_api.get_elo_graph(user_id)
+    if response.status_code != 200:
+        return None
+
+    graph_info = response.json()
+    content = await _download(graph_info['filename'])
+    if content is None:
+        return None
+    return GraphImage(content, graph_info['start_date'], graph_info['end_date'])
+
+
+async def _load_character_graph(user_id: int) -> GraphImage | None:
+    response = await andross_api.get_character_graph(user_id)
+    if response.status_code != 200:
+        return None
+
+    content = await _download(response.text)
+    if content is None:
+        return None
+    return GraphImage(content)
+
+
+def render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn rather than fork, forking a process that's running an event loop and thread pools isn't safe.
+        # Workers re-import main.py, which only imports the bot inside main(), and then just the renderer.
+        _render_pool = ProcessPoolExecutor(max_workers=graph_render_workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+    return _render_pool
+
+
+def close_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+    _render_pool = None
+
+
+def _renderer():
+    # Only needed for local rendering, keeps the renderer off the cog's import path
+    from Andross.discord_bot.cogs.utils import renderer
+    return renderer
+
+
+async def _render(func, *args) -> bytes:
+    async with render_limiter.slot():
+        return await asyncio.get_running_loop().run_in_executor(render_pool(), partial(func, *args))
+
+
+async def _render_elo_graph(user_id: int, name: str) -> GraphImage | None:
+    response = await andross_api.get_elo_history(user_id)
+    if response.status_code != 200 or not response.json():
+        return None
+
+    history = response.json()
+    entry_times = [entry['entry_time'] for entry in history]
+    elos = [entry['elo'] for entry in history]
+    content = await _render(_renderer().render_elo_graph, entry_times, elos, f'{name}\'s elo')
+    return GraphImage(content, min(entry_times)[:10], max(entry_times)[:10])
+
+
+async def _render_character_graph(connect_code: str, name: str) -> GraphImage | None:
+    ranked_data = await async_slippi_api.get_player_ranked_data(connect_code)
+    if not ranked_data or not ranked_data.ranked_profile.characters:
+        return None
+
+    characters = ranked_data.ranked_profile.characters
+    content = await _render(_renderer().render_character_graph,
+                            [character.character for character in characters],
+                            [character.game_count for character in characters],
+                            [SlippiCharacterColors.get(character.character, '#808080') for character in characters],
+                            f'{name}\'s character usage')
+    return GraphImage(content)
+
+
+def stats_version() -> str | None:
+    # Stats updates land for every user at once, so the leaderboard's latest entry_time versions every graph
+    return leaderboard_service.entry_time
+
+
+def invalidate_user_graphs(user_id: int):
+    graph_cache.invalidate_where(lambda key: key[1] == user_id)
+
+
+async def _get_graph(graph_type: str, user_id: int, loader) -> GraphImage | None:
+    version = stats_version()
+    key = (graph_type, user_id, version)
+    if key not in graph_cache:
+        graph_cache.invalidate_where(lambda cached: cached[:2] == key[:2] and cached[2] != version)
+
+    # Without a known stats version fall back to a short freshness window
+    ttl = None if version else graph_freshness
+    return await graph_cache.get_or_load(key, loader, ttl=ttl)
+
+
+async def get_elo_graph(local_user: dict, mode: str | None = None) -> GraphImage | None:
+    user_id = local_user['id']
+    if (mode or graph_render_mode) == 'local':
+        return await _get_graph('elo:local', user_id, lambda: _render_elo_graph(user_id, local_user['name']))
+    return await _get_graph('elo', user_id, lambda: _load_elo_graph(user_id))
+
+
+async def get_character_graph(local_user: dict, mode: str | None = None) -> GraphImage | None:
+    user_id = local_user['id']
+    if (mode or graph_render_mode) == 'local':
+        return await _get_graph('characters:local', user_id,
+                                lambda: _render_character_graph(local_user['cc'], local_user['name']))
+    return await _get_graph('characters', user_id, lambda: _load_character_graph(user_id))
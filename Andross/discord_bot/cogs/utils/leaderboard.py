@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from os import getenv
+
+import numpy as np
+from zoneinfo import ZoneInfo
+
+from Andross.andross_api.andross_api import andross_api
+from Andross.andross_api.cache import AsyncTTLCache
+from Andross.andross_api.slippi_client import normalize_connect_code
+from Andross.discord_bot.cogs.utils.ranks import rank_columns, rank_table
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+page_size = 10
+
+# full downloads the whole board per stats update, server asks the API for one page window at a time
+leaderboard_pagination = getenv('LEADERBOARD_PAGINATION', 'full')
+leaderboard_page_cache = int(getenv('LEADERBOARD_PAGE_CACHE', 256))
+leaderboard_page_ttl = float(getenv('LEADERBOARD_PAGE_TTL', 300))
+
+
+def format_entry_time(entry_time: str | None) -> str:
+    if not entry_time:
+        return 'Failed to get date'
+
+    latest_date = datetime.strptime(entry_time, '%Y-%m-%d %H:%M:%S.%f').replace(tzinfo=ZoneInfo('UTC'))
+    return latest_date.astimezone(tz=ZoneInfo('America/Detroit')).strftime('%Y-%m-%d %H:%M:%S')
+
+
+@dataclass(frozen=True)
+class Placement:
+    position: int
+    page: int
+
+
+class LeaderboardSnapshot:
+    """One leaderboard update stored as read-only columns.
+
+    Leaderboard messages don't hold on to it, their buttons only name a page number that is resolved against the
+    latest snapshot. Pages are formatted the first time anyone asks for them.
+    """
+    __slots__ = ('positions', 'names', 'elo', 'wins', 'losses', 'dgp', 'rank_id', 'entry_time', 'date', 'offset',
+                 'placements', '_pages')
+
+    def __init__(self, positions: np.ndarray, names: tuple[str, ...], columns: dict[str, np.ndarray],
+                 entry_time: str | None, offset: int = 0, placements: dict[int | str, int] | None = None):
+        self.positions = positions
+        self.names = names
+        # user id and normalized connect code -> row, empty when the API's rows don't carry them
+        self.placements = placements or {}
+        self.elo = columns['elo']
+        self.wins = columns['wins']
+        self.losses = columns['losses']
+        self.dgp = columns['dgp']
+        self.rank_id = columns['rank_id']
+        for column in (self.positions, self.elo, self.wins, self.losses, self.dgp, self.rank_id):
+            column.flags.writeable = False
+        self.entry_time = entry_time
+        self.date = format_entry_time(entry_time)
+        # Row index of the first row within the whole board, non zero for a server side page window
+        self.offset = offset
+        self._pages: dict[int, str] = {}
+
+    @classmethod
+    def build(cls, leaderboard: list[dict], entry_time: str | None, offset: int = 0) -> 'LeaderboardSnapshot':
+        positions = np.fromiter((entry['position'] for entry in leaderboard), dtype=np.int32, count=len(leaderboard))
+        names = tuple(entry['name'] for entry in leaderboard)
+        placements = {}
+        for row, entry in enumerate(leaderboard):
+            if entry.get('id') is not None:
+                placements[entry['id']] = row
+            if entry.get('cc'):
+                placements[normalize_connect_code(entry['cc'])] = row
+        return cls(positions, names, rank_columns(leaderboard), entry_time, offset, placements)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def page_count(self) -> int:
+        return max(math.ceil(len(self) / page_size), 1)
+
+    def placement(self, user: int | str) -> Placement | None:
+        row = self.placements.get(user if isinstance(user, int) else normalize_connect_code(user))
+        if row is None:
+            return None
+        return Placement(int(self.positions[row]), (self.offset + row) // page_size)
+
+    def format_rows(self, start: int, stop: int) -> list[str]:
+        def generate_whitespace(n):
+            return " " * n
+
+        rank_names = rank_table.rank_names
+        rows = []
+        for counter, position, name, elo, wins, losses, rank_id in zip(
+                range(self.offset + start + 1, self.offset + stop + 1), self.positions[start:stop].tolist(), self.names[start:stop],
+                self.elo[start:stop].tolist(), self.wins[start:stop].tolist(), self.losses[start:stop].tolist(),
+                self.rank_id[start:stop].tolist()):
+            base_whitespace = 13
+            whitespace_amount_front = 2 if counter <= 9 else 1
+            whitespace_amount = (base_whitespace - len(name))
+            rows.append(f"{position}."
+                        f"{generate_whitespace(whitespace_amount_front)}{name}"
+                        f"{generate_whitespace(whitespace_amount)}"
+                        f"| {elo:.1f} "
+                        f"({wins}/{losses}) "
+                        f"{rank_names[rank_id]}")
+        return rows
+
+    def page(self, page: int) -> str:
+        page %= self.page_count
+        text = self._pages.get(page)
+        if text is None:
+            start = page * page_size
+            text = self._pages[page] = '\n'.join(self.format_rows(start, start + page_size))
+        return text
+
+
+@dataclass(frozen=True)
+class LeaderboardPage:
+    number: int
+    text: str
+    # None while paging server side and the last page hasn't been seen yet
+    page_count: int | None
+    date: str
+
+
+class LeaderboardService:
+    """Serves leaderboard pages, only refetching when a new stats update has landed.
+
+    In full mode the whole board is downloaded once per update and kept as a LeaderboardSnapshot. In server mode
+    only the requested page window is fetched, with the pages either side prefetched in the background, so the
+    first page costs the same however large the board gets.
+    """
+
+    def __init__(self, pagination: str = leaderboard_pagination):
+        self.pagination = pagination
+        self.snapshot: LeaderboardSnapshot | None = None
+        self.entry_time: str | None = None
+        self.date = format_entry_time(None)
+        self.page_count: int | None = None
+        self.windows = AsyncTTLCache('leaderboard_pages', maxsize=leaderboard_page_cache, ttl=leaderboard_page_ttl)
+        self._lock = asyncio.Lock()
+        self._initial_load: asyncio.Task | None = None
+        self._prefetches: set[asyncio.Task] = set()
+
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot is not None if self.pagination == 'full' else self.entry_time is not None
+
+    async def _ensure_loaded(self):
+        if not self.loaded:
+            # Everyone asking before the first load finishes waits on the same one
+            if self._initial_load is None or self._initial_load.done():
+                self._initial_load = asyncio.get_running_loop().create_task(self.refresh())
+            await asyncio.shield(self._initial_load)
+
+    async def refresh(self, force: bool = False) -> LeaderboardSnapshot | None:
+        async with self._lock:
+            response = await andross_api.get_latest_elo()
+            if response.status_code != 200:
+                logger.warning('Unable to get latest date')
+                entry_time = None
+            else:
+                entry_time = response.json()['entry_time']
+
+            # No newer stats update (or we can't tell), keep serving what we have
+            if self.loaded and not force and (not entry_time or entry_time == self.entry_time):
+                return self.snapshot
+
+            if self.pagination == 'server':
+                self._set_version(entry_time)
+                self.windows.clear()
+                self.page_count = None
+                logger.info('Leaderboard pages reset for %s', entry_time)
+                return None
+
+            response = await andross_api.get_leaderboard()
+            if response.status_code != 200:
+                logger.warning('Unable to get leaderboard: %s', response.status_code)
+                return self.snapshot
+
+            self._set_snapshot(LeaderboardSnapshot.build(response.json(), entry_time))
+            return self.snapshot
+
+    def _set_version(self, entry_time: str | None):
+        self.entry_time = entry_time
+        self.date = format_entry_time(entry_time)
+
+    def _set_snapshot(self, snapshot: LeaderboardSnapshot):
+        self.snapshot = snapshot
+        self.page_count = snapshot.page_count
+        self._set_version(snapshot.entry_time)
+        logger.info('Leaderboard snapshot rebuilt: %d rows, %s', len(snapshot), snapshot.entry_time)
+
+    async def _fetch_window(self, page: int) -> LeaderboardSnapshot | None:
+        response = await andross_api.get_leaderboard(offset=page * page_size, limit=page_size)
+        if response.status_code != 200:
+            logger.warning('Unable to get leaderboard page %d: %s', page, response.status_code)
+            return None
+
+        rows = response.json()
+        if len(rows) > page_size:
+            # The API ignored offset/limit and sent the whole board, no point asking for it again per page
+            logger.warning('Leaderboard API does not paginate, switching to full leaderboard mode')
+            self.pagination = 'full'
+            self._set_snapshot(LeaderboardSnapshot.build(rows, self.entry_time))
+            return None
+        return LeaderboardSnapshot.build(rows, self.entry_time, offset=page * page_size)
+
+    async def _window(self, page: int) -> LeaderboardSnapshot | None:
+        return await self.windows.get_or_load((self.entry_time, page), lambda: self._fetch_window(page))
+
+    async def _prefetch_window(self, page: int):
+        try:
+            await self._window(page)
+        except Exception as e:
+            logger.debug('Prefetching leaderboard page %d failed: %s: %s', page, type(e).__name__, e)
+
+    def _prefetch(self, *pages: int):
+        for page in pages:
+            if page < 0 or (self.page_count and page >= self.page_count) \
+                    or (self.entry_time, page) in self.windows:
+                continue
+            task = asyncio.get_running_loop().create_task(self._prefetch_window(page))
+            self._prefetches.add(task)
+            task.add_done_callback(self._prefetches.discard)
+
+    async def placement(self, user: int | str) -> Placement | None:
+        """Where a user id or connect code sits on the board, None when they aren't on it.
+
+        Answered from the snapshot's placement index when there is one, otherwise (server side paging, or rows
+        without ids) by asking /rest/get_lbe/, which only knows user ids.
+        """
+        await self._ensure_loaded()
+        if self.pagination == 'full' and self.snapshot and self.snapshot.placements:
+            return self.snapshot.placement(user)
+        if not isinstance(user, int):
+            return None
+
+        response = await andross_api.get_leaderboard_entry(user)
+        if response.status_code != 200:
+            return None
+        position = response.json()['position']
+        return Placement(position, max(position - 1, 0) // page_size)
+
+    async def page(self, page: int) -> LeaderboardPage | None:
+        """Page number page of the current board, wrapping around at either end when the page count is known."""
+        await self._ensure_loaded()
+        if self.pagination == 'full':
+            if not self.snapshot:
+                return None
+            page %= self.snapshot.page_count
+            return LeaderboardPage(page, self.snapshot.page(page), self.snapshot.page_count, self.snapshot.date)
+
+        page = page % self.page_count if self.page_count else max(page, 0)
+        window = await self._window(page)
+        if window is None:
+            # The API may have just turned out not to paginate
+            return await self.page(page) if self.pagination == 'full' else None
+        if not len(window) and page:
+            # Walked off the end of the board
+            self.page_count = page
+            return await self.page(0)
+        if len(window) < page_size:
+            self.page_count = page + 1
+
+        self._prefetch(page - 1, page + 1)
+        return LeaderboardPage(page, window.page(0), self.page_count, self.date)
+
+
+leaderboard_service = LeaderboardService()
+
+metrics.register_cache(leaderboard_service.windows)
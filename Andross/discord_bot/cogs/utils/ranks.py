@@ -0,0 +1,65 @@
+from bisect import bisect_right
+
+import numpy as np
+from slippi.slippi_ranks import grand_master, rank_list
+
+# Rank ids index into rank_names, the two leaderboard only states come first
+NO_RANK, PENDING = 0, 1
+placement_games = 5
+
+
+class RankTable:
+    """Sorted elo breakpoints built once from slippi_ranks, so a rank is a bisect instead of a scan over rank_list.
+
+    Matches get_rank exactly, including falling through to the last rank for elos that land between two ranks'
+    bounds (the lists leave 0.01 wide gaps) or below the first one.
+    """
+
+    def __init__(self, ranks=rank_list, grandmaster=grand_master):
+        self.rank_names = ('None', 'Pending') + tuple(rank.rank_name for rank in ranks) + (grandmaster.rank_name,)
+        self.grandmaster_id = len(self.rank_names) - 1
+        self.grandmaster_elo = grandmaster.lower_bound
+        fallback = 2 + len(ranks) - 1
+
+        edges = sorted({bound for rank in ranks for bound in (rank.lower_bound, rank.upper_bound)})
+        ids = []
+        for edge in edges:
+            # Every interval between two edges starts on one, so the edge's rank is the interval's rank
+            matched = next((index for index, rank in enumerate(ranks) if rank.lower_bound <= edge < rank.upper_bound),
+                           None)
+            ids.append(fallback if matched is None else 2 + matched)
+        self.edges = tuple(edges)
+        self.fallback = fallback
+        self._edges = np.asarray(edges, dtype=np.float64)
+        self._ids = np.asarray([fallback] + ids, dtype=np.uint8)
+
+    def rank_id(self, elo: float, daily_global_placement: int | None = None) -> int:
+        if daily_global_placement and elo >= self.grandmaster_elo:
+            return self.grandmaster_id
+        return int(self._ids[bisect_right(self.edges, elo)])
+
+    def rank_name(self, elo: float, daily_global_placement: int | None = None) -> str:
+        return self.rank_names[self.rank_id(elo, daily_global_placement)]
+
+    def assign(self, elos: np.ndarray, dgps: np.ndarray, wins: np.ndarray, losses: np.ndarray) -> np.ndarray:
+        """Rank ids for a whole board at once, with None/Pending for players without enough games."""
+        rank_ids = self._ids[np.searchsorted(self._edges, elos, side='right')]
+        rank_ids[(dgps > 0) & (elos >= self.grandmaster_elo)] = self.grandmaster_id
+        games = wins + losses
+        rank_ids[games < placement_games] = PENDING
+        rank_ids[games == 0] = NO_RANK
+        return rank_ids
+
+
+rank_table = RankTable()
+
+
+def rank_columns(leaderboard: list[dict]) -> dict[str, np.ndarray]:
+    """Pulls the rank relevant fields out of the API's rows into typed columns plus their rank ids."""
+    elos = np.fromiter((entry['latest_elo'] or 0 for entry in leaderboard), dtype=np.float64, count=len(leaderboard))
+    dgps = np.fromiter((entry['latest_dgp'] or 0 for entry in leaderboard), dtype=np.int32, count=len(leaderboard))
+    wins = np.fromiter((entry['latest_wins'] or 0 for entry in leaderboard), dtype=np.int32, count=len(leaderboard))
+    losses = np.fromiter((entry['latest_losses'] or 0 for entry in leaderboard), dtype=np.int32,
+                         count=len(leaderboard))
+    return {'elo': elos, 'dgp': dgps, 'wins': wins, 'losses': losses,
+            'rank_id': rank_table.assign(elos, dgps, wins, losses)}
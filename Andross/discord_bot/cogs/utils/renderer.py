@@ -0,0 +1,91 @@
+import io
+
+import numpy as np
+
+# Runs inside spawned worker processes, which only import main.py (the bot itself is imported inside main()) and
+# this module. Keep it free of discord/slippi imports so starting a worker stays cheap, matplotlib is imported lazily.
+
+background_color = '#2b2d31'
+text_color = '#dbdee1'
+line_color = '#21ba45'
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _to_png(figure) -> bytes:
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', facecolor=figure.get_facecolor(), bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def prepare_elo_history(entry_times: list[str], elos: list[float]) -> tuple[np.ndarray, np.ndarray]:
+    times = np.array([entry_time.replace(' ', 'T') for entry_time in entry_times], dtype='datetime64[ms]')
+    values = np.asarray(elos, dtype=np.float64)
+
+    order = np.argsort(times, kind='stable')
+    times, values = times[order], values[order]
+
+    # Stats snapshots are taken every 20 minutes, only keep the points where the elo actually moved
+    keep = np.ones(len(values), dtype=bool)
+    if len(values) > 2:
+        keep[1:-1] = (np.diff(values)[:-1] != 0) | (np.diff(values)[1:] != 0)
+    return times[keep], values[keep]
+
+
+def prepare_character_usage(names: list[str], counts: list[int], colors: list[str],
+                            min_share: float = 0.02) -> tuple[list[str], np.ndarray, list[str]]:
+    counts = np.asarray(counts, dtype=np.int64)
+    order = np.argsort(counts)[::-1]
+    counts = counts[order]
+    names = [names[i] for i in order]
+    colors = [colors[i] for i in order]
+
+    shares = counts / max(counts.sum(), 1)
+    major = shares >= min_share
+    if major.all():
+        return names, counts, colors
+
+    major_count = int(major.sum())
+    return (names[:major_count] + ['OTHER'],
+            np.append(counts[major], counts[~major].sum()),
+            colors[:major_count] + ['#808080'])
+
+
+def render_elo_graph(entry_times: list[str], elos: list[float], title: str) -> bytes:
+    times, values = prepare_elo_history(entry_times, elos)
+
+    plt = _pyplot()
+    figure, axes = plt.subplots(figsize=(10, 5), facecolor=background_color)
+    try:
+        axes.set_facecolor(background_color)
+        axes.plot(times, values, color=line_color, linewidth=2)
+        axes.set_title(title, color=text_color)
+        axes.set_ylabel('Elo', color=text_color)
+        axes.tick_params(colors=text_color)
+        axes.grid(alpha=0.2)
+        for spine in axes.spines.values():
+            spine.set_color(text_color)
+        figure.autofmt_xdate()
+        return _to_png(figure)
+    finally:
+        plt.close(figure)
+
+
+def render_character_graph(names: list[str], counts: list[int], colors: list[str], title: str) -> bytes:
+    names, counts, colors = prepare_character_usage(names, counts, colors)
+
+    plt = _pyplot()
+    figure, axes = plt.subplots(figsize=(7, 7), facecolor=background_color)
+    try:
+        axes.pie(counts, labels=[name.replace('_', ' ').title() for name in names], colors=colors,
+                 autopct='%1.1f%%', startangle=90, counterclock=False,
+                 textprops={'color': text_color}, wedgeprops={'edgecolor': background_color})
+        axes.set_title(title, color=text_color)
+        return _to_png(figure)
+    finally:
+        plt.close(figure)
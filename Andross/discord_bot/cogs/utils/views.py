@@ -1,19 +1,117 @@
+import logging
+
 import discord
-from discord.ext import commands
 from discord.ui import View
 
 from slippi.slippi_user import SlippiUser
-from Andross.discord_bot.cogs.utils.components import CharacterDropdown
+from Andross.andross_api.limits import UpstreamBusyError
+from Andross.andross_api.slippi_client import SlippiTimeoutError, async_slippi_api
+from Andross.discord_bot.cogs.utils.components import CharacterDropdown, create_character_embed
+from Andross.discord_bot.cogs.utils.leaderboard import LeaderboardPage, leaderboard_service
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+# custom_id layouts, everything needed to answer a click lives in the id itself:
+#   andross:lb:<page>:<prev|next>
+#   andross:chars:<connect code>
+leaderboard_prefix = 'andross:lb'
+characters_prefix = 'andross:chars'
+
+
+class StatelessView(View):
+    """Components only, clicks are answered by dispatch_interaction from their custom_id.
+
+    The view is stopped straight away so discord.py never keeps it in its view store, nothing is held per message
+    and the components keep working for as long as the message exists, across restarts and on any shard process.
+    """
+
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.stop()
+
+
+class LeaderboardView(StatelessView):
+
+    def __init__(self, page: LeaderboardPage):
+        super().__init__()
+        if page.number:
+            previous_page = page.number - 1
+        else:
+            # Page count isn't known yet when paging server side, stay on the first page
+            previous_page = page.page_count - 1 if page.page_count else 0
+        # Past the last page leaderboard_service.page() wraps back to the first one
+        next_page = page.number + 1
+        self.add_item(discord.ui.Button(emoji='⬅️', style=discord.ButtonStyle.green,
+                                        custom_id=f'{leaderboard_prefix}:{previous_page}:prev'))
+        self.add_item(discord.ui.Button(emoji='➡️', style=discord.ButtonStyle.green,
+                                        custom_id=f'{leaderboard_prefix}:{next_page}:next'))
+
+
+class UserStatsView(StatelessView):
+
+    def __init__(self, user_slippi: SlippiUser):
+        super().__init__()
+        characters = user_slippi.ranked_profile.characters
+        if characters:
+            self.add_item(CharacterDropdown(f'{characters_prefix}:{user_slippi.connect_code.lower()}', characters))
+
+
+async def show_leaderboard_page(interaction: discord.Interaction, page: int):
+    lb_page = await leaderboard_service.page(page)
+    if not lb_page:
+        await interaction.response.send_message('Unable to get leaderboard please try again', ephemeral=True)
+        return
+
+    embed = interaction.message.embeds[0]
+    embed.description = f'```{lb_page.text}```'
+    embed.set_footer(text=lb_page.date)
+    await interaction.response.edit_message(embed=embed, view=LeaderboardView(lb_page))
+
+
+async def show_characters(interaction: discord.Interaction, connect_code: str, selected: list[str]):
+    if (connect_code, False) not in async_slippi_api.profiles:
+        # Has to go back to slippi.gg, acknowledge now so the interaction doesn't time out meanwhile
+        await interaction.response.defer()
+
+    ranked_data = await async_slippi_api.get_player_ranked_data(connect_code)
+    characters = ranked_data.ranked_profile.characters if ranked_data else []
+    total_games = sum(character.game_count for character in characters)
+    embeds = interaction.message.embeds[:1]
+    embeds.extend(create_character_embed(character, total_games)
+                  for character in characters if character.character in selected)
 
+    if interaction.response.is_done():
+        await interaction.edit_original_response(embeds=embeds)
+    else:
+        await interaction.response.edit_message(embeds=embeds)
 
-class UserStatsView(View):
 
-    def __init__(self, ctx: commands.Context, embed: discord.Embed, user_slippi: SlippiUser):
-        super().__init__(timeout=60)
+async def reply_error(interaction: discord.Interaction, message: str):
+    # The click may already have been deferred while waiting on slippi.gg
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
 
-        self._ctx = ctx
-        self.embeds = [embed]
 
-        self.characters = user_slippi.ranked_profile.characters
+async def dispatch_interaction(interaction: discord.Interaction) -> bool:
+    """Answers clicks on LeaderboardView and UserStatsView components, False when the interaction isn't ours."""
+    if interaction.type != discord.InteractionType.component or not interaction.message:
+        return False
 
-        self.add_item(CharacterDropdown(ctx, self.characters))
+    custom_id = interaction.data.get('custom_id', '')
+    try:
+        if custom_id.startswith(f'{leaderboard_prefix}:'):
+            await show_leaderboard_page(interaction, int(custom_id.split(':')[2]))
+        elif custom_id.startswith(f'{characters_prefix}:'):
+            await show_characters(interaction, custom_id[len(characters_prefix) + 1:],
+                                  interaction.data.get('values', []))
+        else:
+            return False
+    except (UpstreamBusyError, SlippiTimeoutError) as e:
+        await reply_error(interaction, str(e))
+    except Exception as e:
+        # Answer anyway, an unanswered or deferred click shows up as "This interaction failed"
+        logger.error('Interaction %s failed: %s: %s', custom_id, type(e).__name__, e, exc_info=e)
+        await reply_error(interaction, 'Something went wrong, please try again in a moment')
+    return True
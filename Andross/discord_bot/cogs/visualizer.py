@@ -1,14 +1,13 @@
-import datetime
 import logging
-import os
-from datetime import datetime
+from typing import Literal
 
 import discord
-import requests
 from discord.ext import commands
 
 from Andross.discord_bot.cogs.utils.colors import slippi_green
-from Andross.andross_api.andross_api import api_url
+from Andross.discord_bot.cogs.utils.graphs import close_render_pool, get_character_graph, get_elo_graph
+from Andross.andross_api.limits import UpstreamBusyError
+from Andross.andross_api.user_registry import user_registry
 
 logger = logging.getLogger(f'andross.{__name__}')
 
@@ -16,6 +15,9 @@ discordMemberStr = discord.Member | str
 memberstr_description = 'Connect code or a discord member, if left empty it will use the person who issues the command'
 memberstr_parameter = commands.parameter(default=lambda ctx: ctx.author, description=memberstr_description)
 memberbool_description = 'Boolean (ex. 0, 1, True, False) or a discord member'
+rendermode_description = 'Where to render the graph, server (Andross API) or local (the bot itself)'
+rendermode_parameter = commands.parameter(default=None, description=rendermode_description)
+RenderMode = Literal['server', 'local']
 
 
 class VisualizerCog(commands.Cog, name='Visualizer'):
@@ -23,97 +25,65 @@ class VisualizerCog(commands.Cog, name='Visualizer'):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_unload(self):
+        close_render_pool()
+
     async def cog_command_error(self, ctx: commands.Context, error: commands.CommandError):
+        if isinstance(error, commands.CommandInvokeError) and isinstance(error.original, UpstreamBusyError):
+            await ctx.send(str(error.original))
+            return
         logger.error(f'{error}')
 
         await ctx.send(f'An error occurred: {error}')
 
     @commands.command(name='elo', help='Generate a graph of your elo overtime')
-    async def __elo(self, ctx: commands.Context):
-        logger.info(f'__elo: {ctx}')
+    async def __elo(self, ctx: commands.Context, mode: RenderMode = rendermode_parameter):
+        logger.info('__elo: %s, %s', ctx, mode)
 
         # Attempt to get local user info
-        response = requests.get(f'{api_url}/rest/user/{ctx.author.id}')
+        response = await user_registry.get_user(ctx.author.id)
         if response.status_code == 404 or response.status_code != 200:
             await ctx.send('You\'re not registered, please register with the register command.')
             await ctx.send_help('reg')
             return
         local_user = response.json()
 
-        response = requests.get(f'{api_url}/get_elo_graph', params={'id': ctx.author.id})
-        if response.status_code != 200:
+        graph = await get_elo_graph(local_user, mode)
+        if not graph:
             await ctx.send('Unable to generate a graph, please try again later.')
             return
 
-        graph_info = response.json()
-
-        response = requests.get(f'{api_url}/static/images/graphs/' + graph_info['filename'])
-
-        cwd = os.getcwd()
-        sub_directory = 'imgs'
-        sub_path = os.path.join(cwd, sub_directory)
-
-        if not os.path.exists(sub_path):
-            os.makedirs(sub_path)
-
-        # concatenate directory path with image file name
-        filename = f'elo_{local_user["id"]}.png'
-        filepath = os.path.join(cwd, sub_directory, filename)
-
-        with open(filepath, 'wb') as file:
-            file.write(response.content)
-
-        file = discord.File(filepath, filename='elo_graph.png')
+        file = graph.to_file('elo_graph.png')
 
         # create an embed object and set its properties
         embed = discord.Embed(title=f'{local_user["name"]}\'s elo graph',
                               description='',
                               color=slippi_green)
-        embed.set_footer(text=f'{graph_info["start_date"]} -> '
-                              f'{graph_info["end_date"]}',
+        embed.set_footer(text=f'{graph.start_date} -> '
+                              f'{graph.end_date}',
                          icon_url='https://avatars.githubusercontent.com/u/45867030?s=200&v=4')
         embed.set_image(url='attachment://elo_graph.png')
         # send the embed with the image to a channel
         await ctx.send(file=file, embed=embed)
 
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
     @commands.command(name='characters', help='Generate a pie graph of your character usage')
-    async def __characters(self, ctx: commands.Context):
-        logger.info(f'__characters: {ctx}')
+    async def __characters(self, ctx: commands.Context, mode: RenderMode = rendermode_parameter):
+        logger.info('__characters: %s, %s', ctx, mode)
 
         # Attempt to get local user info
-        response = requests.get(f'{api_url}/rest/user/{ctx.author.id}')
+        response = await user_registry.get_user(ctx.author.id)
         if response.status_code == 404 or response.status_code != 200:
             await ctx.send('You\'re not registered, please register with the register command.')
             await ctx.send_help('reg')
             return
         local_user = response.json()
 
-        response = requests.get(f'{api_url}/get_character_graph', params={'id': ctx.author.id})
-        if response.status_code != 200:
+        graph = await get_character_graph(local_user, mode)
+        if not graph:
             await ctx.send('Unable to generate a graph, please try again later.')
             return
 
-        # Download the image
-        response = requests.get(f'{api_url}/static/images/graphs/' + response.text)
-
-        cwd = os.getcwd()
-        sub_directory = 'imgs'
-        sub_path = os.path.join(cwd, sub_directory)
-
-        if not os.path.exists(sub_path):
-            os.makedirs(sub_path)
-
-        # concatenate directory path with image file name
-        filename = f'characters_{local_user["id"]}.png'
-        filepath = os.path.join(cwd, sub_directory, filename)
-
-        with open(filepath, 'wb') as file:
-            file.write(response.content)
-
-        file = discord.File(filepath, filename='character_graph.png')
+        file = graph.to_file('character_graph.png')
 
         # create an embed object and set its properties
         embed = discord.Embed(title=f'{local_user["name"]}\'s character usage',
@@ -125,9 +95,6 @@ class VisualizerCog(commands.Cog, name='Visualizer'):
         # send the embed with the image to a channel
         await ctx.send(file=file, embed=embed)
 
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(VisualizerCog(bot))
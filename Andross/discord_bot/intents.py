@@ -0,0 +1,84 @@
+"""Gateway intents profiles.
+
+all       Every intent, every member cached and chunked at startup. The original behaviour.
+default   discord.py's default intents plus message content, no member list or presences.
+minimal   Only what the cogs need: guilds, guild/dm messages and message content. Nothing is cached for members,
+          discord.Member arguments are resolved lazily (mentions come with the message, everything else is a
+          single query_members by id or name through the gateway), so !user @someone keeps working.
+"""
+import logging
+import resource
+from collections import Counter
+from os import getenv
+
+import discord
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+intents_profile = getenv('INTENTS_PROFILE', 'all')
+gateway_event_stats = getenv('GATEWAY_EVENT_STATS', '0').lower() in ('1', 'true', 'yes')
+
+
+def _minimal_intents() -> discord.Intents:
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    return intents
+
+
+def _default_intents() -> discord.Intents:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    return intents
+
+
+profiles = {
+    'all': (discord.Intents.all, discord.MemberCacheFlags.all, True),
+    'default': (_default_intents, discord.MemberCacheFlags.none, False),
+    'minimal': (_minimal_intents, discord.MemberCacheFlags.none, False),
+}
+
+
+def intents_config(profile: str = intents_profile) -> dict:
+    """Keyword arguments for the bot constructor, CHUNK_GUILDS overrides the profile's chunking policy."""
+    if profile not in profiles:
+        raise ValueError(f'Unknown INTENTS_PROFILE {profile}, expected one of {", ".join(profiles)}')
+
+    intents_factory, member_cache_factory, chunk_guilds = profiles[profile]
+    chunk_guilds = getenv('CHUNK_GUILDS', str(chunk_guilds)).lower() in ('1', 'true', 'yes')
+    return {
+        'intents': intents_factory(),
+        'member_cache_flags': member_cache_factory(),
+        'chunk_guilds_at_startup': chunk_guilds,
+        'enable_debug_events': gateway_event_stats,
+    }
+
+
+gateway_events = Counter()
+
+
+def record_gateway_event(event_type: str):
+    gateway_events[event_type] += 1
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is the peak, in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def footprint(bot: discord.Client) -> dict:
+    return {
+        'profile': intents_profile,
+        'rss_mb': round(_rss_bytes() / (1024 * 1024), 1),
+        'guilds': len(bot.guilds),
+        'cached_members': sum(len(guild.members) for guild in bot.guilds),
+        'cached_users': len(bot.users),
+        'gateway_events': sum(gateway_events.values()),
+        'top_gateway_events': dict(gateway_events.most_common(5)),
+    }
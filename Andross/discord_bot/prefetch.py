@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import random
+import time
+from os import getenv
+
+from discord.ext import tasks
+
+from Andross.andross_api.limits import UpstreamBusyError, slippi_limiter
+from Andross.andross_api.slippi_client import async_slippi_api
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+prefetch_interval = float(getenv('PREFETCH_INTERVAL', 60))
+prefetch_concurrency = int(getenv('PREFETCH_CONCURRENCY', 2))
+prefetch_active_window = float(getenv('PREFETCH_ACTIVE_WINDOW', 60 * 60))
+prefetch_batch = int(getenv('PREFETCH_BATCH', 50))
+# Mean seconds per slippi.gg call above which the next runs back off
+prefetch_slow_call = float(getenv('PREFETCH_SLOW_CALL', 2))
+prefetch_max_backoff = 16
+
+
+class RankedDataPrefetcher:
+    """Keeps recently requested slippi profiles warm in async_slippi_api's cache.
+
+    Every run refreshes the profiles commands asked for within the active window that would expire before the next
+    run, a few at a time. Runs are jittered so shards don't line up, stretched out while slippi.gg is slow or
+    erroring, and a run stops early whenever interactive commands are waiting on the slippi limiter.
+    """
+
+    def __init__(self, interval: float = prefetch_interval, concurrency: int = prefetch_concurrency,
+                 active_window: float = prefetch_active_window, batch: int = prefetch_batch):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.active_window = active_window
+        self.batch = batch
+        self.backoff = 1
+
+    def due(self) -> list[tuple[str, bool]]:
+        horizon = self.interval * self.backoff * 1.2
+        due = []
+        for key in async_slippi_api.recently_requested(self.active_window):
+            expires_in = async_slippi_api.profiles.expires_in(key)
+            if expires_in is None or expires_in < horizon:
+                due.append(key)
+                if len(due) >= self.batch:
+                    break
+        return due
+
+    @tasks.loop(seconds=prefetch_interval)
+    async def run(self):
+        try:
+            due = self.due()
+            if due:
+                await self._prefetch(due)
+        except Exception as e:
+            logger.error('prefetch run failed: %s: %s', type(e).__name__, e)
+        self.run.change_interval(seconds=self.interval * self.backoff * random.uniform(.8, 1.2))
+
+    async def _prefetch(self, due: list[tuple[str, bool]]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcome = {'ok': 0, 'error': 0, 'busy': 0, 'skipped': 0}
+        elapsed = []
+
+        async def refresh(connect_code: str, is_max: bool):
+            async with semaphore:
+                # Commands waiting on slippi.gg go first, whatever is left waits for the next run
+                if outcome['busy'] or slippi_limiter.queued or slippi_limiter.pacing:
+                    outcome['skipped'] += 1
+                    return
+                started = time.monotonic()
+                try:
+                    await async_slippi_api.prefetch(connect_code, is_max)
+                    outcome['ok'] += 1
+                except UpstreamBusyError:
+                    outcome['busy'] += 1
+                except Exception as e:
+                    outcome['error'] += 1
+                    logger.debug('prefetch %s: %s: %s', connect_code, type(e).__name__, e)
+                elapsed.append(time.monotonic() - started)
+
+        await asyncio.gather(*(refresh(*key) for key in due))
+
+        mean = sum(elapsed) / len(elapsed) if elapsed else 0
+        if outcome['busy'] or outcome['error'] * 4 > len(due) or mean > prefetch_slow_call:
+            self.backoff = min(self.backoff * 2, prefetch_max_backoff)
+        else:
+            self.backoff = max(self.backoff // 2, 1)
+
+        for status, count in outcome.items():
+            metrics.inc('andross_prefetch_total', count, status=status)
+        metrics.gauge_set('andross_prefetch_backoff', self.backoff)
+        logger.debug('prefetched %d profiles: %s, mean %.2fs, backoff x%d', len(due), outcome, mean, self.backoff)
+
+
+ranked_prefetcher = RankedDataPrefetcher()
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from os import getenv
+
+from discord.ext import commands
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+reload_drain_timeout = float(getenv('RELOAD_DRAIN_TIMEOUT', 30))
+
+
+class ExtensionBusyError(Exception):
+
+    def __init__(self, extension: str, inflight: int):
+        super().__init__(f'{extension} still has {inflight} command(s) running')
+        self.extension = extension
+        self.inflight = inflight
+
+
+class ExtensionReloader:
+    """Reloads extensions in place once the commands running in them have finished.
+
+    While an extension drains, new commands for it are turned away instead of starting on the old cog. Caches,
+    the leaderboard snapshot and the API clients live in the utils and andross_api modules, which reload_extension
+    leaves alone, so they carry over to the reloaded cog untouched.
+    """
+
+    def __init__(self, drain_timeout: float = reload_drain_timeout):
+        self.drain_timeout = drain_timeout
+        self.inflight: Counter[str] = Counter()
+        self.draining: set[str] = set()
+        self._idle: dict[str, asyncio.Event] = {}
+        self._lock = asyncio.Lock()
+
+    def command_started(self, ctx: commands.Context):
+        module = ctx.command.module
+        if module in self.draining:
+            raise commands.CheckFailure(f'{ctx.command.cog_name or module} is being updated, try again in a moment')
+        self.inflight[module] += 1
+
+    def command_finished(self, ctx: commands.Context):
+        module = ctx.command.module
+        self.inflight[module] -= 1
+        if self.inflight[module] <= 0:
+            del self.inflight[module]
+            if module in self._idle:
+                self._idle[module].set()
+
+    async def reload(self, bot: commands.Bot, extension: str) -> float:
+        """Drains and reloads extension, returns how long that took. One reload runs at a time."""
+        async with self._lock:
+            return await self._reload(bot, extension)
+
+    async def _reload(self, bot: commands.Bot, extension: str) -> float:
+        started = time.perf_counter()
+        self.draining.add(extension)
+        idle = self._idle[extension] = asyncio.Event()
+        try:
+            if self.inflight[extension]:
+                logger.info('Draining %d command(s) from %s', self.inflight[extension], extension)
+                try:
+                    await asyncio.wait_for(idle.wait(), self.drain_timeout)
+                except asyncio.TimeoutError:
+                    raise ExtensionBusyError(extension, self.inflight[extension])
+            # reload_extension rolls back to the old module if the new one fails to load
+            await bot.reload_extension(extension)
+        finally:
+            self.draining.discard(extension)
+            del self._idle[extension]
+
+        elapsed = time.perf_counter() - started
+        logger.info('Reloaded %s in %.1fms', extension, elapsed * 1000)
+        return elapsed
+
+
+extension_reloader = ExtensionReloader()
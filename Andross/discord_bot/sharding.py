@@ -0,0 +1,91 @@
+import logging
+import math
+import time
+from collections import defaultdict
+from os import getenv
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+
+def parse_shard_ids(shard_ids: str | None) -> list[int] | None:
+    """Parses SHARD_IDS, a comma separated list of ids and inclusive ranges (ex. '0-3,8')."""
+    if not shard_ids:
+        return None
+
+    parsed = []
+    for part in shard_ids.split(','):
+        part = part.strip()
+        if '-' in part:
+            start, end = part.split('-')
+            parsed.extend(range(int(start), int(end) + 1))
+        elif part:
+            parsed.append(int(part))
+    return parsed
+
+
+def shard_config() -> dict:
+    """Keyword arguments for AutoShardedBot, from SHARD_COUNT and SHARD_IDS.
+
+    Leaving both unset lets discord pick the recommended shard count and run every shard in this process.
+    """
+    shard_count = getenv('SHARD_COUNT')
+    shard_ids = parse_shard_ids(getenv('SHARD_IDS'))
+    if shard_ids and not shard_count:
+        raise ValueError('SHARD_IDS requires SHARD_COUNT to be set')
+
+    config = {}
+    if shard_count:
+        config['shard_count'] = int(shard_count)
+    if shard_ids:
+        config['shard_ids'] = shard_ids
+    return config
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """Spreads shard ids as evenly as possible over processes, contiguous ranges per process."""
+    processes = max(min(processes, shard_count), 1)
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class ShardMetrics:
+    """Per shard event counters and connection state, event rates are computed between reports."""
+
+    def __init__(self):
+        self.events = defaultdict(int)
+        self.connects = defaultdict(int)
+        self.disconnects = defaultdict(int)
+        self.resumes = defaultdict(int)
+        self._last_events = {}
+        self._last_report = time.monotonic()
+
+    def record_event(self, shard_id: int | None):
+        self.events[shard_id or 0] += 1
+
+    def snapshot(self, latencies: list[tuple[int, float]]) -> list[dict]:
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-9)
+        report = []
+        for shard_id, latency in latencies:
+            events = self.events[shard_id]
+            report.append({
+                'shard_id': shard_id,
+                'latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+                'events': events,
+                'events_per_sec': round((events - self._last_events.get(shard_id, 0)) / elapsed, 3),
+                'connects': self.connects[shard_id],
+                'disconnects': self.disconnects[shard_id],
+                'resumes': self.resumes[shard_id],
+            })
+            self._last_events[shard_id] = events
+        self._last_report = now
+        return report
+
+
+shard_metrics = ShardMetrics()
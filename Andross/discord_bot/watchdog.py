@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from os import getenv
+
+from Andross.metrics import metrics
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+watchdog_interval = float(getenv('WATCHDOG_INTERVAL', 0.1))
+watchdog_threshold = float(getenv('WATCHDOG_THRESHOLD', 0.25))
+
+
+class LoopWatchdog:
+    """Measures event loop lag and reports callbacks that block the loop.
+
+    A task on the loop sleeps for interval and records how late it wakes up. A separate thread watches the
+    timestamp that task leaves behind, when the loop goes quiet for longer than threshold the thread grabs the
+    loop thread's stack and the command the blocked task belongs to, so the offender shows up in the logs while
+    it's still blocking.
+    """
+
+    def __init__(self, interval: float = watchdog_interval, threshold: float = watchdog_threshold):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = deque(maxlen=4096)
+        self.stalls = 0
+        self.inflight: dict[asyncio.Task, str] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._last_beat = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+        self._task = None
+
+    def command_started(self, command: str):
+        task = asyncio.current_task()
+        if task:
+            self.inflight[task] = command
+
+    def command_finished(self):
+        self.inflight.pop(asyncio.current_task(), None)
+
+    async def _measure(self):
+        while True:
+            started = time.monotonic()
+            self._last_beat = started
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(now - started - self.interval, 0)
+            self.lags.append(lag)
+            metrics.observe('andross_loop_lag_seconds', lag)
+
+    def _current_command(self) -> str | None:
+        # asyncio keeps the running task per loop in this module level dict, reading it from another thread is racy
+        # but only ever used for the report
+        current_tasks = getattr(asyncio.tasks, '_current_tasks', {})
+        task = current_tasks.get(self._loop)
+        if task is None:
+            return None
+        return self.inflight.get(task) or task.get_name()
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+
+            reported_beat = beat
+            self.stalls += 1
+            metrics.inc('andross_loop_stalls_total')
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else 'unavailable'
+            logger.warning('Event loop blocked for %.0fms by %s\n%s',
+                           blocked_for * 1000, self._current_command() or 'unknown', stack)
+
+    def lag_percentiles(self) -> dict:
+        if not self.lags:
+            return {}
+        ordered = sorted(self.lags)
+        pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+        return {'p50_ms': pick(.5), 'p95_ms': pick(.95), 'p99_ms': pick(.99), 'max_ms': pick(1),
+                'stalls': self.stalls}
+
+
+loop_watchdog = LoopWatchdog()
@@ -2,6 +2,8 @@
 
 if [ "$1" == "start" ]; then
     python3.10 -u main.py
+elif [ "$1" == "launcher" ]; then
+    python3.10 -u launcher.py "${@:2}"
 elif [ "$1" == "shell" ]; then
     /bin/bash
 else
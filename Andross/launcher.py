@@ -0,0 +1,84 @@
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from discord_bot.sharding import split_shards
+
+logger = logging.getLogger('andross.launcher')
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {number}')
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs Andross as several processes, each owning a range of shards.')
+    parser.add_argument('-s', '--shard-count', type=positive_int, required=True, help='Total number of shards')
+    parser.add_argument('-p', '--processes', type=positive_int, default=os.cpu_count() or 1,
+                        help='Number of bot processes to spread the shards over, defaults to the cpu count')
+    parser.add_argument('--restart-delay', type=float, default=5,
+                        help='Seconds to wait before restarting a process that exited')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    shard_ranges = split_shards(args.shard_count, args.processes)
+    processes: dict[int, subprocess.Popen] = {}
+    # Process index -> when to start it again, exited processes wait here without holding up the others
+    restarts: dict[int, float] = {}
+    stopping = False
+
+    def spawn(index: int) -> subprocess.Popen:
+        shard_ids = shard_ranges[index]
+        env = dict(os.environ,
+                   SHARD_COUNT=str(args.shard_count),
+                   SHARD_IDS=','.join(str(shard_id) for shard_id in shard_ids),
+                   SHARD_PROCESS=str(index))
+        # One metrics endpoint per process, on consecutive ports
+        if os.getenv('METRICS_PORT'):
+            env['METRICS_PORT'] = str(int(os.getenv('METRICS_PORT')) + index)
+        logger.info('Starting process %d with shards %d-%d', index, shard_ids[0], shard_ids[-1])
+        return subprocess.Popen([sys.executable, '-u', main_path], env=env)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        restarts.clear()
+        for process in processes.values():
+            process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(len(shard_ranges)):
+        processes[index] = spawn(index)
+
+    while processes or restarts:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            if process.poll() is None:
+                continue
+            del processes[index]
+            if not stopping:
+                logger.warning('Process %d exited with %s, restarting in %.0fs',
+                               index, process.returncode, args.restart_delay)
+                restarts[index] = time.monotonic() + args.restart_delay
+
+        now = time.monotonic()
+        for index, restart_at in list(restarts.items()):
+            # stop() empties restarts, nothing is started once shutdown has begun
+            if restart_at <= now and not stopping:
+                del restarts[index]
+                processes[index] = spawn(index)
+
+
+if __name__ == '__main__':
+    main()
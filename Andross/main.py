@@ -1,32 +1,21 @@
 import logging
 import os
-import sys
 
-from discord_bot.bot import bot
-from custom_logging import CustomFormatter, format_string
+from custom_logging import setup_logging
 
 
 logger = logging.getLogger('andross')
-logger.setLevel(logging.DEBUG)
-
-stdout_handler = logging.StreamHandler(sys.stdout)
-file_handler = logging.FileHandler('log.log')
-
-stdout_handler.setLevel(logging.DEBUG)
-file_handler.setLevel(logging.DEBUG)
-
-formatter = logging.Formatter(format_string)
-stdout_handler.setFormatter(CustomFormatter())
-file_handler.setFormatter(formatter)
-
-logger.addHandler(stdout_handler)
-logger.addHandler(file_handler)
 
 
 def main():
+    # Imported here, graph render workers are spawned and re-import this module, they shouldn't load the bot too
+    from discord_bot.bot import bot
+
+    setup_logging()
     logger.info('Andross started')
 
-    bot.run(os.getenv('DISCORD_TOKEN'))
+    # Logging is already set up, keep discord.py from adding its own blocking stderr handler
+    bot.run(os.getenv('DISCORD_TOKEN'), log_handler=None)
 
 
 if __name__ == '__main__':
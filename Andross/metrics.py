@@ -0,0 +1,152 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from os import getenv
+from typing import Callable, Iterable
+
+logger = logging.getLogger(f'andross.{__name__}')
+
+metrics_host = getenv('METRICS_HOST', '127.0.0.1')
+metrics_port = int(getenv('METRICS_PORT', 0))
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple[float, ...] = default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms keyed by metric name and label set, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.counters: dict[str, dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self.gauges: dict[str, dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: dict[str, dict[Labels, Histogram]] = defaultdict(dict)
+        self.collectors: list[Callable[[], Iterable[tuple[str, dict, float]]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[name][_labels(labels)] += value
+
+    def gauge_add(self, name: str, value: float, **labels):
+        self.gauges[name][_labels(labels)] += value
+
+    def gauge_set(self, name: str, value: float, **labels):
+        self.gauges[name][_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        histogram = self.histograms[name].get(key)
+        if histogram is None:
+            histogram = self.histograms[name][key] = Histogram()
+        histogram.observe(value)
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple[str, dict, float]]]):
+        """collector is called on every render and yields (gauge name, labels, value) samples."""
+        self.collectors.append(collector)
+
+    def register_cache(self, cache):
+        """Exposes an AsyncTTLCache's info() counters as andross_cache{cache=..., stat=...} samples."""
+        def collect():
+            info = cache.info()
+            for stat, value in info.items():
+                if isinstance(value, (int, float)):
+                    yield 'andross_cache', {'cache': info['name'], 'stat': stat}, value
+
+        self.register_collector(collect)
+
+    @asynccontextmanager
+    async def track_upstream(self, upstream: str, endpoint: str):
+        """Times one upstream call, the block can set tracker['status'] to label the outcome."""
+        tracker = {'status': 'ok'}
+        self.gauge_add('andross_upstream_inflight', 1, upstream=upstream, endpoint=endpoint)
+        started = time.perf_counter()
+        try:
+            yield tracker
+        except BaseException as e:
+            tracker['status'] = type(e).__name__
+            raise
+        finally:
+            self.observe('andross_upstream_duration_seconds', time.perf_counter() - started,
+                         upstream=upstream, endpoint=endpoint)
+            self.inc('andross_upstream_requests_total', upstream=upstream, endpoint=endpoint,
+                     status=tracker['status'])
+            self.gauge_add('andross_upstream_inflight', -1, upstream=upstream, endpoint=endpoint)
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self.counters.items():
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{_format_labels(labels)} {value}' for labels, value in series.items())
+
+        gauges = {name: dict(series) for name, series in self.gauges.items()}
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, {})[_labels(labels)] = value
+            except Exception as e:
+                logger.warning('metrics collector failed: %s: %s', type(e).__name__, e)
+        for name, series in gauges.items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.extend(f'{name}{_format_labels(labels)} {value}' for labels, value in series.items())
+
+        for name, series in self.histograms.items():
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, ("le", str(bound)))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {histogram.count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+async def start_metrics_server(host: str = metrics_host, port: int = metrics_port):
+    """Serves GET /metrics, returns the runner to clean up or None when METRICS_PORT isn't set."""
+    if not port:
+        return None
+
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Metrics served on http://%s:%s/metrics', host, port)
+    return runner